@@ -0,0 +1,179 @@
+import os
+import io
+import gzip
+import json
+import queue
+import tempfile
+import threading
+from typing import Callable, List, Optional
+from backend.metrics import stage_timer
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Artifacts get a directory of their own; retention deletes files in it, so it
+# must not be shared with anything else (the committed uploads/*.json).
+ARTIFACTS_DIR = os.getenv('ARTIFACTS_DIR', os.path.join(os.path.dirname(__file__), '..', 'uploads', 'artifacts'))
+ARTIFACTS_URL = os.getenv('ARTIFACTS_URL', '/uploads/artifacts')
+ARTIFACT_CODEC = os.getenv('ARTIFACT_CODEC', 'gzip')
+ARTIFACT_MAX_BYTES = int(os.getenv('ARTIFACT_MAX_BYTES', 10 * 1024 * 1024 * 1024))
+ARTIFACT_MAX_FILES = int(os.getenv('ARTIFACT_MAX_FILES', 1000))
+ARTIFACT_QUEUE_SIZE = int(os.getenv('ARTIFACT_QUEUE_SIZE', 16))
+ARTIFACT_GZIP_LEVEL = int(os.getenv('ARTIFACT_GZIP_LEVEL', 6))
+ARTIFACT_ZSTD_LEVEL = int(os.getenv('ARTIFACT_ZSTD_LEVEL', 3))
+
+
+class ArtifactCodec:
+    def __init__(self, name: str, suffix: str, open_stream: Callable):
+        self.name = name
+        self.suffix = suffix
+        self.open_stream = open_stream
+
+
+ARTIFACT_CODECS = {}
+
+
+def register_artifact_codec(name: str, suffix: str, open_stream: Callable) -> ArtifactCodec:
+    codec = ArtifactCodec(name, suffix, open_stream)
+    ARTIFACT_CODECS[name] = codec
+    return codec
+
+
+def _open_gzip(raw):
+    return gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=ARTIFACT_GZIP_LEVEL)
+
+
+def _open_zstd(raw):
+    return zstandard.ZstdCompressor(level=ARTIFACT_ZSTD_LEVEL).stream_writer(raw, closefd=False)
+
+
+register_artifact_codec('gzip', '.ndjson.gz', _open_gzip)
+if zstandard is not None:
+    register_artifact_codec('zstd', '.ndjson.zst', _open_zstd)
+
+
+def get_codec(name: str = None) -> ArtifactCodec:
+    name = name or ARTIFACT_CODEC
+    if name not in ARTIFACT_CODECS:
+        print(f"[Artifacts] Codec {name} unavailable, falling back to gzip")
+        name = 'gzip'
+    return ARTIFACT_CODECS[name]
+
+
+def artifact_url(name: str) -> str:
+    return f"{ARTIFACTS_URL}/{name}"
+
+
+def enforce_retention(directory: str = ARTIFACTS_DIR, max_bytes: int = ARTIFACT_MAX_BYTES,
+                      max_files: int = ARTIFACT_MAX_FILES, keep: str = None):
+    suffixes = tuple(codec.suffix for codec in ARTIFACT_CODECS.values())
+    entries = []
+    for entry in os.scandir(directory):
+        # Only finished artifacts count; temp files start with '.'.
+        if entry.is_file() and entry.name.endswith(suffixes) and not entry.name.startswith('.'):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path, entry.name))
+    entries.sort()
+    total = sum(size for _, size, _, _ in entries)
+    count = len(entries)
+    for _, size, path, name in entries:
+        if total <= max_bytes and count <= max_files:
+            break
+        if name == keep:
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        count -= 1
+
+
+class ArtifactWriter:
+    # Rows are compressed on a background thread, so callers only pay for a
+    # bounded queue put; an artifact whose content hash is already stored is
+    # not written again, and nothing is written until the first row arrives.
+    def __init__(self, content_hash: str, codec: str = None, directory: str = ARTIFACTS_DIR):
+        self.codec = get_codec(codec)
+        self.directory = directory
+        self.name = f"{content_hash[:32]}{self.codec.suffix}"
+        self.path = os.path.join(directory, self.name)
+        self.rows = 0
+        self.error = None
+        self._queue = None
+        self._thread = None
+        self._tmp_path = None
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.path):
+            os.utime(self.path)
+            self.existing = True
+            return
+        self.existing = False
+
+    def _start(self):
+        fd, self._tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.', suffix=self.codec.suffix)
+        self._raw = os.fdopen(fd, 'wb')
+        self._queue = queue.Queue(maxsize=ARTIFACT_QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._run, name=f"artifact-{self.name}", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            with self.codec.open_stream(self._raw) as compressed:
+                out = io.TextIOWrapper(compressed, encoding='utf-8', write_through=True)
+                while True:
+                    rows = self._queue.get()
+                    if rows is None:
+                        break
+                    out.write(''.join(json.dumps(row, default=str, ensure_ascii=False) + '\n' for row in rows))
+                out.flush()
+                out.detach()
+        except Exception as e:
+            self.error = e
+            # Keep draining so producers never block on a dead writer.
+            while self._queue.get() is not None:
+                pass
+        finally:
+            self._raw.close()
+
+    def write_many(self, rows: List[dict]):
+        if not rows:
+            return
+        self.rows += len(rows)
+        if self.existing:
+            return
+        if self._thread is None:
+            self._start()
+        self._queue.put(rows)
+
+    def _finish(self):
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def close(self) -> Optional[str]:
+        if self.existing:
+            return artifact_url(self.name)
+        if self._thread is None:
+            # Every row was a duplicate; an empty artifact is not worth keeping.
+            return None
+        with stage_timer('artifact', rows=self.rows) as measured:
+            self._finish()
+            if self.error is not None:
+                os.remove(self._tmp_path)
+                raise self.error
+            os.replace(self._tmp_path, self.path)
+            measured['bytes'] = os.path.getsize(self.path)
+        enforce_retention(self.directory, keep=self.name)
+        return artifact_url(self.name)
+
+    def discard(self):
+        if self.existing:
+            return
+        self._finish()
+        if self._tmp_path is not None and os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
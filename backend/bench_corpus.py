@@ -0,0 +1,128 @@
+import os
+import io
+import json
+import random
+import string
+import zipfile
+from typing import Callable, Dict, List
+
+BENCH_SEED = int(os.getenv('BENCH_SEED', 1337))
+BENCH_DUPLICATE_RATE = float(os.getenv('BENCH_DUPLICATE_RATE', 0.1))
+
+SOFTWARE = ['Google Chrome', 'Microsoft Edge', 'Mozilla Firefox', 'Opera GX', 'Brave', 'Yandex']
+DOMAINS = ['gmail.com', 'yahoo.com', 'outlook.com', 'mail.ru', 'proton.me', 'icloud.com']
+SITES = ['accounts.google.com', 'facebook.com', 'steamcommunity.com', 'netflix.com', 'github.com', 'paypal.com']
+
+
+def _word(rng: random.Random, low: int = 5, high: int = 12) -> str:
+    return ''.join(rng.choices(string.ascii_lowercase + string.digits, k=rng.randint(low, high)))
+
+
+def generate_leaks(count: int, seed: int = BENCH_SEED, duplicate_rate: float = BENCH_DUPLICATE_RATE) -> List[dict]:
+    rng = random.Random(seed)
+    leaks = []
+    for _ in range(count):
+        if leaks and rng.random() < duplicate_rate:
+            leaks.append(dict(rng.choice(leaks)))
+            continue
+        user = _word(rng)
+        leaks.append({
+            'software': rng.choice(SOFTWARE),
+            'url': f"https://{rng.choice(SITES)}/{_word(rng, 3, 8)}",
+            'username': f"{user}@{rng.choice(DOMAINS)}" if rng.random() < 0.7 else user,
+            'password': _word(rng, 8, 16),
+        })
+    return leaks
+
+
+def render_soft(leaks: List[dict]) -> bytes:
+    return ''.join(
+        f"SOFT: {l['software']}\nURL: {l['url']}\nUSER: {l['username']}\nPASS: {l['password']}\n\n" for l in leaks
+    ).encode()
+
+
+def render_custom(leaks: List[dict]) -> bytes:
+    return ''.join(
+        f"URL: {l['url']}\nUsername: {l['username']}\nPassword: {l['password']}\nApplication: {l['software']}\n"
+        f"===============\n" for l in leaks
+    ).encode()
+
+
+def render_combolist(leaks: List[dict]) -> bytes:
+    return ''.join(f"{l['url']}:{l['username']}:{l['password']}\n" for l in leaks).encode()
+
+
+def render_json(leaks: List[dict]) -> bytes:
+    return json.dumps(leaks).encode()
+
+
+def render_csv(leaks: List[dict]) -> bytes:
+    import pandas as pd
+    return pd.DataFrame(leaks).to_csv(index=False).encode()
+
+
+def render_xlsx(leaks: List[dict]) -> bytes:
+    import pandas as pd
+    out = io.BytesIO()
+    pd.DataFrame(leaks).to_excel(out, index=False)
+    return out.getvalue()
+
+
+def _split(leaks: List[dict], parts: int) -> List[List[dict]]:
+    size = max(1, -(-len(leaks) // parts))
+    return [leaks[i:i + size] for i in range(0, len(leaks), size)]
+
+
+def render_zip(leaks: List[dict]) -> bytes:
+    # Stealer-log shape: per-machine folders with a nested archive inside.
+    soft, custom, nested = _split(leaks, 3)
+    inner = io.BytesIO()
+    with zipfile.ZipFile(inner, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr('passwords.csv', render_csv(nested))
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr('PC-1/Passwords.txt', render_soft(soft))
+        z.writestr('PC-2/All Passwords.txt', render_custom(custom))
+        z.writestr('PC-2/Cookies/cookies.txt', b'.google.com\tTRUE\t/\tFALSE\t0\tSID\tx\n' * 100)
+        z.writestr('PC-3/logs.zip', inner.getvalue())
+    return out.getvalue()
+
+
+def render_7z(leaks: List[dict]) -> bytes:
+    import py7zr
+    soft, combo = _split(leaks, 2)
+    out = io.BytesIO()
+    with py7zr.SevenZipFile(out, 'w') as archive:
+        archive.writestr(render_soft(soft), 'PC-1/Passwords.txt')
+        archive.writestr(render_combolist(combo), 'combo.txt')
+    return out.getvalue()
+
+
+CORPUS_FORMATS: Dict[str, tuple] = {
+    'soft': ('.txt', render_soft),
+    'custom': ('.txt', render_custom),
+    'combolist': ('.txt', render_combolist),
+    'json': ('.json', render_json),
+    'csv': ('.csv', render_csv),
+    'xlsx': ('.xlsx', render_xlsx),
+    'zip': ('.zip', render_zip),
+    '7z': ('.7z', render_7z),
+}
+
+
+def register_corpus_format(name: str, ext: str, render: Callable[[List[dict]], bytes]):
+    CORPUS_FORMATS[name] = (ext, render)
+
+
+def write_corpus(directory: str, rows: int, formats: List[str] = None, seed: int = BENCH_SEED) -> Dict[str, str]:
+    os.makedirs(directory, exist_ok=True)
+    leaks = generate_leaks(rows, seed)
+    paths = {}
+    for name in formats or list(CORPUS_FORMATS):
+        ext, render = CORPUS_FORMATS[name]
+        path = os.path.join(directory, f"{name}_{rows}{ext}")
+        if not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.write(render(leaks))
+        paths[name] = path
+    return paths
@@ -0,0 +1,271 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+from backend.bench_corpus import CORPUS_FORMATS, generate_leaks, write_corpus
+
+BENCH_ROWS = int(os.getenv('BENCH_ROWS', 100000))
+BENCH_BATCH_SIZE = int(os.getenv('BENCH_BATCH_SIZE', 1000))
+BENCH_SEARCH_QUERIES = int(os.getenv('BENCH_SEARCH_QUERIES', 200))
+BENCH_TOLERANCE = float(os.getenv('BENCH_TOLERANCE', 0.2))
+BENCH_BASELINE = os.getenv('BENCH_BASELINE', os.path.join(os.path.dirname(__file__), '..', 'bench_baseline.json'))
+
+STAGES = ['parse', 'dedup', 'insert', 'search']
+
+
+class FakeClickHouseClient:
+    # In-process stand-in for clickhouse_driver.Client that understands the
+    # handful of statements the ingest and search paths issue.
+    def __init__(self):
+        self.columns = ['id', 'software', 'url', 'username', 'password', 'domain', 'extra', 'date']
+        self.rows = []
+        self.fingerprints = set()
+
+    def disconnect(self):
+        pass
+
+    def _insert(self, sql: str, data, columnar: bool):
+        columns = [c.strip(' `') for c in re.search(r"\((.*)\) VALUES", sql).group(1).split(',')]
+        rows = zip(*data) if columnar else ([row.get(c, '') for c in columns] for row in data)
+        for values in rows:
+            row = dict(zip(columns, values))
+            self.rows.append(row)
+            self.fingerprints.add(row.get('fingerprint'))
+
+    def _search(self, params: dict) -> List[tuple]:
+        q = params['q']
+        matches = []
+        for row in self.rows:
+            values = [str(row.get(f, '')).lower() for f in ('username', 'url', 'password')]
+            if q in values:
+                score = 2.0
+            elif any(q in v for v in values):
+                score = 1.0
+            else:
+                continue
+            matches.append((score, row))
+        matches.sort(key=lambda m: m[0], reverse=True)
+        page = matches[params['offset']:params['offset'] + params['limit']]
+        return [tuple(row.get(c) for c in self.columns) + (score,) for score, row in page]
+
+    def execute(self, sql: str, params=None, external_tables=None, columnar: bool = False, settings=None):
+        statement = sql.lstrip().upper()
+        if statement.startswith('ALTER'):
+            return []
+        if statement.startswith('INSERT'):
+            self._insert(sql, params, columnar)
+            return []
+        if external_tables:
+            if external_tables[0]['name'] != '_dedup_batch':
+                return []
+            return [(r['fingerprint'],) for r in external_tables[0]['data'] if r['fingerprint'] in self.fingerprints]
+        if 'fingerprint = 0' in sql:
+            return [(1,)] if 0 in self.fingerprints else []
+        if params and 'q' in params:
+            return self._search(params)
+        return [(1,)]
+
+    def execute_iter(self, sql: str, params=None, settings=None):
+        return iter(self.execute(sql, params))
+
+
+def make_pool(use_clickhouse: bool = False):
+    from backend.clickhouse_pool import ClickHousePool, get_pool
+    if use_clickhouse:
+        return get_pool()
+    client = FakeClickHouseClient()
+    return ClickHousePool(size=1, factory=lambda: client)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def peak_rss_mb() -> float:
+    # VmHWM is reset on exec, unlike ru_maxrss which a spawned child inherits
+    # from its parent.
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def summarize(rows: int, seconds: float, latencies: List[float]) -> dict:
+    return {
+        'rows': rows,
+        'seconds': round(seconds, 4),
+        'rows_per_sec': round(rows / seconds, 1) if seconds else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def _timed_batches(batches, handle) -> dict:
+    rows, latencies = 0, []
+    start = time.perf_counter()
+    for batch in batches:
+        t = time.perf_counter()
+        rows += handle(batch)
+        latencies.append(time.perf_counter() - t)
+    return summarize(rows, time.perf_counter() - start, latencies)
+
+
+def bench_parse(path: str, batch_size: int = BENCH_BATCH_SIZE) -> dict:
+    from backend.parse_executor import iter_chunks
+    from backend.parsing_utils import iter_extract_and_parse
+    rows, latencies = 0, []
+    start = time.perf_counter()
+    t = start
+    # Latency is the time taken to produce each batch of parsed rows.
+    for batch in iter_chunks(iter_extract_and_parse(path), batch_size):
+        now = time.perf_counter()
+        latencies.append(now - t)
+        rows += len(batch)
+        t = now
+    return summarize(rows, time.perf_counter() - start, latencies)
+
+
+def bench_dedup(rows: int, batch_size: int = BENCH_BATCH_SIZE, use_clickhouse: bool = False) -> dict:
+    from backend.dedup import LeakDeduplicator
+    from backend.parse_executor import iter_chunks
+    leaks = generate_leaks(rows)
+    pool = make_pool(use_clickhouse)
+    with pool.connection() as client:
+        dedup = LeakDeduplicator(client)
+
+        def handle(batch):
+            for _ in dedup.filter(batch):
+                pass
+            return len(batch)
+
+        result = _timed_batches(iter_chunks(leaks, batch_size), handle)
+    result['duplicates'] = dedup.duplicates
+    return result
+
+
+def bench_insert(rows: int, batch_size: int = BENCH_BATCH_SIZE, use_clickhouse: bool = False) -> dict:
+    from backend.ingest_writer import LeakWriter
+    from backend.parse_executor import iter_chunks
+    leaks = generate_leaks(rows)
+    writer = LeakWriter(pool=make_pool(use_clickhouse), publish=False)
+    start = time.perf_counter()
+    result = _timed_batches(iter_chunks(leaks, batch_size), lambda batch: len(writer.write_many(batch)))
+    writer.close()
+    result['seconds'] = round(time.perf_counter() - start, 4)
+    result['rows_per_sec'] = round(rows / result['seconds'], 1) if result['seconds'] else 0.0
+    return result
+
+
+def bench_search(rows: int, queries: int = BENCH_SEARCH_QUERIES, use_clickhouse: bool = False) -> dict:
+    from backend.ingest_writer import LeakWriter
+    from backend.search import search
+    leaks = generate_leaks(rows)
+    pool = make_pool(use_clickhouse)
+    if not use_clickhouse:
+        with LeakWriter(pool=pool, publish=False) as writer:
+            writer.write_many(leaks)
+    rng = random.Random(rows)
+    terms = [rng.choice(leaks)['username'].split('@')[0] for _ in range(queries)]
+    returned, latencies = 0, []
+    start = time.perf_counter()
+    for term in terms:
+        t = time.perf_counter()
+        returned += len(pool.run(search, term, mode='fuzzy'))
+        latencies.append(time.perf_counter() - t)
+    result = summarize(returned, time.perf_counter() - start, latencies)
+    result['queries'] = queries
+    result['queries_per_sec'] = round(queries / result['seconds'], 1) if result['seconds'] else 0.0
+    return result
+
+
+def run_isolated(fn, *args, **kwargs) -> dict:
+    # Each stage runs in a fresh process so peak RSS is attributable to it.
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(fn, *args, **kwargs).result()
+
+
+def run_benchmarks(rows: int, stages: List[str], formats: List[str], workdir: str,
+                   use_clickhouse: bool = False) -> Dict[str, dict]:
+    results = {}
+    if 'parse' in stages:
+        for name, path in write_corpus(workdir, rows, formats).items():
+            results[f"parse:{name}"] = run_isolated(bench_parse, path)
+            print(f"[Bench] parse:{name} {results[f'parse:{name}']}")
+    for stage, fn in (('dedup', bench_dedup), ('insert', bench_insert), ('search', bench_search)):
+        if stage in stages:
+            results[stage] = run_isolated(fn, rows, use_clickhouse=use_clickhouse)
+            print(f"[Bench] {stage} {results[stage]}")
+    return results
+
+
+def compare_to_baseline(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float = BENCH_TOLERANCE) -> List[str]:
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous or previous.get('rows') != current.get('rows'):
+            continue
+        if current['rows_per_sec'] < previous['rows_per_sec'] * (1 - tolerance):
+            regressions.append(f"{name}: rows/s {current['rows_per_sec']} vs baseline {previous['rows_per_sec']}")
+        if previous['p99_ms'] and current['p99_ms'] > previous['p99_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {current['p99_ms']}ms vs baseline {previous['p99_ms']}ms")
+        if current['peak_rss_mb'] > previous['peak_rss_mb'] * (1 + tolerance):
+            regressions.append(f"{name}: peak RSS {current['peak_rss_mb']}MB vs baseline {previous['peak_rss_mb']}MB")
+    return regressions
+
+
+def print_report(results: Dict[str, dict]):
+    print(f"{'stage':<18}{'rows':>10}{'rows/s':>14}{'p50 ms':>10}{'p99 ms':>10}{'rss MB':>10}")
+    for name, r in results.items():
+        print(f"{name:<18}{r['rows']:>10}{r['rows_per_sec']:>14}{r['p50_ms']:>10}{r['p99_ms']:>10}{r['peak_rss_mb']:>10}")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the leak ingestion and search pipeline.")
+    parser.add_argument('--rows', type=int, default=BENCH_ROWS)
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--formats', nargs='+', choices=list(CORPUS_FORMATS), default=list(CORPUS_FORMATS))
+    parser.add_argument('--workdir', default=os.getenv('BENCH_DIR'))
+    parser.add_argument('--baseline', default=BENCH_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=BENCH_TOLERANCE)
+    parser.add_argument('--clickhouse', action='store_true',
+                        help="Use the configured ClickHouse server instead of the in-process fake (writes to Leaked_DB).")
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='leak-bench-')
+    results = run_benchmarks(args.rows, args.stages, args.formats, workdir, args.clickhouse)
+    print_report(results)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"[Bench] Baseline saved to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print("[Bench] No baseline found, run with --save-baseline to record one.")
+        return 0
+    with open(args.baseline, encoding='utf-8') as f:
+        regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+    for regression in regressions:
+        print(f"[Bench] REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,155 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+CHECKPOINT_DB = os.getenv('TG_CHECKPOINT_DB', 'telegram_checkpoints.sqlite3')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS processed_messages (
+    channel_id TEXT NOT NULL,
+    message_id INTEGER NOT NULL,
+    file_hash TEXT,
+    rows INTEGER NOT NULL DEFAULT 0,
+    processed_at REAL NOT NULL,
+    PRIMARY KEY (channel_id, message_id)
+);
+CREATE TABLE IF NOT EXISTS ingested_files (
+    file_hash TEXT PRIMARY KEY,
+    channel_id TEXT NOT NULL,
+    message_id INTEGER NOT NULL,
+    rows INTEGER NOT NULL DEFAULT 0,
+    ingested_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS channel_watermarks (
+    channel_id TEXT PRIMARY KEY,
+    low_water_mark INTEGER NOT NULL
+);
+"""
+
+
+def file_sha256(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class CheckpointStore:
+    def __init__(self, path: str = CHECKPOINT_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def get_watermark(self, channel_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT low_water_mark FROM channel_watermarks WHERE channel_id = ?", (str(channel_id),)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_watermark(self, channel_id, message_id: int):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO channel_watermarks (channel_id, low_water_mark) VALUES (?, ?) "
+                "ON CONFLICT(channel_id) DO UPDATE SET low_water_mark = MAX(low_water_mark, excluded.low_water_mark)",
+                (str(channel_id), message_id)
+            )
+
+    def is_processed(self, channel_id, message_id: int) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM processed_messages WHERE channel_id = ? AND message_id = ?", (str(channel_id), message_id)
+            ).fetchone()
+        return row is not None
+
+    def has_file(self, file_hash: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM ingested_files WHERE file_hash = ?", (file_hash,)).fetchone()
+        return row is not None
+
+    def complete(self, channel_id, message_id: int, file_hash: str = None, rows: int = 0, watermark: int = None):
+        # The message record, the file hash and the watermark move together in
+        # one transaction so a crash never leaves them out of step.
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO processed_messages (channel_id, message_id, file_hash, rows, processed_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (str(channel_id), message_id, file_hash, rows, now)
+                )
+                if file_hash:
+                    self._conn.execute(
+                        "INSERT OR IGNORE INTO ingested_files (file_hash, channel_id, message_id, rows, ingested_at) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (file_hash, str(channel_id), message_id, rows, now)
+                    )
+                if watermark is not None:
+                    self._conn.execute(
+                        "INSERT INTO channel_watermarks (channel_id, low_water_mark) VALUES (?, ?) "
+                        "ON CONFLICT(channel_id) DO UPDATE SET low_water_mark = MAX(low_water_mark, excluded.low_water_mark)",
+                        (str(channel_id), watermark)
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ChannelCheckpoint:
+    def __init__(self, store: CheckpointStore, channel_id, start_id: int):
+        self.store = store
+        self.channel_id = channel_id
+        self.scanned_max = start_id
+        self.pending = set()
+        self.failed = set()
+
+    def watermark(self) -> int:
+        # Everything at or below the watermark is finished; the oldest
+        # in-flight or failed message holds it back. Only history scans move
+        # scanned_max, so a live message above it never lets the watermark
+        # skip ids that were posted before it but not scanned yet.
+        unfinished = self.pending | self.failed
+        if unfinished:
+            return min(self.scanned_max, min(unfinished) - 1)
+        return self.scanned_max
+
+    def observe(self, message_id: int):
+        if message_id > self.scanned_max:
+            self.scanned_max = message_id
+
+    def begin(self, message_id: int):
+        self.failed.discard(message_id)
+        self.pending.add(message_id)
+
+    def fail(self, message_id: int):
+        self.pending.discard(message_id)
+        self.failed.add(message_id)
+
+    def complete(self, message_id: int, file_hash: str = None, rows: int = 0):
+        self.pending.discard(message_id)
+        self.store.complete(self.channel_id, message_id, file_hash, rows, self.watermark())
+
+    def flush(self):
+        self.store.set_watermark(self.channel_id, self.watermark())
+
+
+_store = None
+
+
+def get_checkpoint_store() -> CheckpointStore:
+    global _store
+    if _store is None:
+        _store = CheckpointStore()
+    return _store
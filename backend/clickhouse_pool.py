@@ -0,0 +1,151 @@
+import os
+import time
+import queue
+import asyncio
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from clickhouse_driver import errors
+from backend.clickhouse_util import get_clickhouse_client
+from backend.metrics import register_gauge
+
+CLICKHOUSE_POOL_SIZE = int(os.getenv('CLICKHOUSE_POOL_SIZE', 8))
+CLICKHOUSE_POOL_TIMEOUT = float(os.getenv('CLICKHOUSE_POOL_TIMEOUT', 30))
+CLICKHOUSE_POOL_PING_INTERVAL = float(os.getenv('CLICKHOUSE_POOL_PING_INTERVAL', 60))
+
+CONNECTION_ERRORS = (errors.NetworkError, errors.SocketTimeoutError, EOFError, OSError)
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ClickHousePool:
+    def __init__(self, size: int = CLICKHOUSE_POOL_SIZE, factory=get_clickhouse_client,
+                 timeout: float = CLICKHOUSE_POOL_TIMEOUT, ping_interval: float = CLICKHOUSE_POOL_PING_INTERVAL):
+        self.size = size
+        self.factory = factory
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._last_used = {}
+
+    def _new_client(self):
+        with self._lock:
+            if self._created >= self.size:
+                return None
+            self._created += 1
+        try:
+            return self.factory()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def _check(self, client):
+        # Connections idle for longer than ping_interval are pinged before
+        # reuse; a dead one is dropped and reconnects lazily on next execute.
+        last_used = self._last_used.get(id(client), 0)
+        if time.monotonic() - last_used < self.ping_interval:
+            return
+        try:
+            alive = client.connection.connected and client.connection.ping()
+        except Exception:
+            alive = False
+        if not alive:
+            client.disconnect()
+
+    def acquire(self, timeout: float = None):
+        try:
+            client = self._idle.get_nowait()
+        except queue.Empty:
+            client = self._new_client()
+            if client is None:
+                try:
+                    client = self._idle.get(timeout=self.timeout if timeout is None else timeout)
+                except queue.Empty:
+                    raise PoolTimeout(f"No ClickHouse connection available after {self.timeout}s")
+        self._check(client)
+        return client
+
+    def release(self, client, broken: bool = False):
+        if broken:
+            client.disconnect()
+        self._last_used[id(client)] = time.monotonic()
+        self._idle.put(client)
+
+    @contextmanager
+    def connection(self, timeout: float = None):
+        client = self.acquire(timeout)
+        broken = False
+        try:
+            yield client
+        except CONNECTION_ERRORS:
+            broken = True
+            raise
+        finally:
+            self.release(client, broken)
+
+    @asynccontextmanager
+    async def connection_async(self, timeout: float = None):
+        client = await asyncio.to_thread(self.acquire, timeout)
+        broken = False
+        try:
+            yield client
+        except CONNECTION_ERRORS:
+            broken = True
+            raise
+        finally:
+            self.release(client, broken)
+
+    def run(self, fn, *args, **kwargs):
+        with self.connection() as client:
+            return fn(client, *args, **kwargs)
+
+    async def run_async(self, fn, *args, **kwargs):
+        return await asyncio.to_thread(self.run, fn, *args, **kwargs)
+
+    def execute(self, *args, **kwargs):
+        with self.connection() as client:
+            return client.execute(*args, **kwargs)
+
+    def close(self):
+        while True:
+            try:
+                client = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            client.disconnect()
+            with self._lock:
+                self._created -= 1
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ClickHousePool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ClickHousePool()
+        return _pool
+
+
+def _pool_stats() -> dict:
+    pool = _pool
+    if pool is None:
+        return {}
+    return {('created',): pool._created, ('idle',): pool._idle.qsize(), ('size',): pool.size}
+
+
+register_gauge('leak_clickhouse_pool_connections', "ClickHouse pool connections.", _pool_stats, ['state'])
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
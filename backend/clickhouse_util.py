@@ -16,4 +16,19 @@ def get_clickhouse_client():
         password=CLICKHOUSE_PASSWORD,
         database=CLICKHOUSE_DATABASE,
         secure=True
-    ) 
\ No newline at end of file
+    ) 
+
+
+def ensure_skip_indexes(client, indexes: dict, table: str = 'Leaked_DB'):
+    # ADD INDEX only covers parts written afterwards, so a newly added index is
+    # also materialized over existing parts (a background mutation). Indexes
+    # that already exist are left alone so restarts don't rebuild them.
+    existing = {row[0] for row in client.execute(
+        "SELECT name FROM system.data_skipping_indices WHERE database = currentDatabase() AND table = %(table)s",
+        {'table': table}
+    )}
+    for name, definition in indexes.items():
+        if name in existing:
+            continue
+        client.execute(f"ALTER TABLE {table} ADD INDEX IF NOT EXISTS {name} {definition}")
+        client.execute(f"ALTER TABLE {table} MATERIALIZE INDEX {name}")
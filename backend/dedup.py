@@ -0,0 +1,105 @@
+import os
+from typing import Iterable, Iterator, List
+from backend.metrics import query_timer, stage_timer
+from backend.normalize import normalize_leak
+
+DEDUP_BATCH_SIZE = int(os.getenv('DEDUP_BATCH_SIZE', 5000))
+# Set to false once no rows with fingerprint = 0 are left to skip the check.
+DEDUP_LEGACY_FALLBACK = os.getenv('DEDUP_LEGACY_FALLBACK', 'true').lower() in ('1', 'true', 'yes')
+
+
+def fetch_existing_fingerprints(client, fingerprints: List[int]) -> set:
+    # The batch is shipped as an external table so the whole lookup is a
+    # single round trip against the indexed fingerprint column.
+    if not fingerprints:
+        return set()
+    rows = client.execute(
+        "SELECT DISTINCT fingerprint FROM Leaked_DB WHERE fingerprint IN _dedup_batch",
+        external_tables=[{
+            'name': '_dedup_batch',
+            'structure': [('fingerprint', 'UInt64')],
+            'data': [{'fingerprint': fingerprint} for fingerprint in fingerprints],
+        }]
+    )
+    return set(row[0] for row in rows)
+
+
+def has_legacy_rows(client) -> bool:
+    # Served by the fingerprint bloom filter, so only granules holding 0 are read.
+    return bool(client.execute("SELECT 1 FROM Leaked_DB WHERE fingerprint = 0 LIMIT 1"))
+
+
+def fetch_existing_legacy(client, leaks: List[dict]) -> set:
+    # Rows inserted before fingerprints existed are narrowed down on username
+    # and password, then fingerprinted here with normalize_leak, so they are
+    # compared exactly like new rows: on host, not on the full URL.
+    if not leaks:
+        return set()
+    rows = client.execute(
+        "SELECT DISTINCT url, username, password FROM Leaked_DB "
+        "WHERE fingerprint = 0 AND (lowerUTF8(trimBoth(username)), password) IN _dedup_legacy",
+        external_tables=[{
+            'name': '_dedup_legacy',
+            'structure': [('username', 'String'), ('password', 'String')],
+            'data': [{'username': leak['username'], 'password': leak['password']} for leak in leaks],
+        }]
+    )
+    return {
+        normalize_leak({'url': url, 'username': username, 'password': password})['fingerprint']
+        for url, username, password in rows
+    }
+
+
+class LeakDeduplicator:
+    def __init__(self, client=None, batch_size: int = DEDUP_BATCH_SIZE, trace=None, pool=None):
+        # With a pool, a connection is checked out per lookup rather than held
+        # for the whole file, so the insert side can always get one too.
+        self.client = client
+        self.pool = pool
+        self.batch_size = batch_size
+        self.trace = trace
+        self.seen = set()
+        self.legacy = None
+        self.parsed = 0
+        self.duplicates = 0
+
+    def _existing(self, client, batch: List[tuple]) -> set:
+        existing = fetch_existing_fingerprints(client, [fingerprint for fingerprint, _ in batch])
+        missing = [(fingerprint, leak) for fingerprint, leak in batch if fingerprint not in existing]
+        if missing and DEDUP_LEGACY_FALLBACK:
+            if self.legacy is None:
+                self.legacy = has_legacy_rows(client)
+            if self.legacy:
+                existing.update(fetch_existing_legacy(client, [leak for _, leak in missing]))
+        return existing
+
+    def _flush(self, batch: List[tuple]) -> Iterator[dict]:
+        with stage_timer('dedup', self.trace, rows=len(batch)), query_timer('dedup_lookup'):
+            if self.pool is not None:
+                with self.pool.connection() as client:
+                    existing = self._existing(client, batch)
+            else:
+                existing = self._existing(self.client, batch)
+        for fingerprint, leak in batch:
+            if fingerprint in existing:
+                self.duplicates += 1
+                continue
+            yield leak
+
+    def filter(self, leaks: Iterable[dict]) -> Iterator[dict]:
+        batch = []
+        for leak in leaks:
+            self.parsed += 1
+            if 'fingerprint' not in leak:
+                leak = normalize_leak(leak)
+            fingerprint = leak['fingerprint']
+            if fingerprint in self.seen:
+                self.duplicates += 1
+                continue
+            self.seen.add(fingerprint)
+            batch.append((fingerprint, leak))
+            if len(batch) >= self.batch_size:
+                yield from self._flush(batch)
+                batch = []
+        if batch:
+            yield from self._flush(batch)
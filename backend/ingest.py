@@ -0,0 +1,81 @@
+import time
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Dict, List
+from backend.artifacts import ArtifactWriter
+from backend.clickhouse_pool import get_pool
+from backend.dedup import LeakDeduplicator
+from backend.ingest_writer import LeakWriter
+from backend.normalize import ensure_normalized_schema
+from backend.parse_executor import get_parse_executor
+from backend.search import ensure_search_indexes
+
+PROGRESS_INTERVAL = 1.0
+
+
+class PermanentError(Exception):
+    # Raised by handlers for failures a retry cannot fix.
+    pass
+
+
+HANDLERS: Dict[str, Callable[..., Awaitable[dict]]] = {}
+
+
+def register_handler(kind: str, handler: Callable[..., Awaitable[dict]]):
+    HANDLERS[kind] = handler
+    return handler
+
+
+def ensure_leak_schema(client):
+    # Run by the API and by standalone workers on startup, so whichever comes
+    # up first adds the columns and indexes the writer and search rely on.
+    ensure_normalized_schema(client)
+    ensure_search_indexes(client)
+
+
+async def regroup_batches(batches: AsyncIterator[List[dict]], size: int) -> AsyncIterator[List[dict]]:
+    # Parse batches are PARSE_BATCH_SIZE rows, far below what one dedup lookup
+    # can take, so they are regrouped to the dedup batch size first.
+    pending = []
+    async for batch in batches:
+        pending.extend(batch)
+        while len(pending) >= size:
+            yield pending[:size]
+            pending = pending[size:]
+    if pending:
+        yield pending
+
+
+def _ingest_batch(writer, dedup, batch):
+    return writer.write_many(dedup.filter(batch))
+
+
+async def ingest_file(file_path: str, content_hash: str, password: str = None, trace=None,
+                      on_progress: Callable[[dict], None] = None, details_limit: int = 0) -> dict:
+    # Parse -> dedup -> insert -> artifact for one file, shared by upload jobs
+    # and Telegram files so both report the same counters.
+    writer = LeakWriter(trace=trace)
+    artifact = ArtifactWriter(content_hash)
+    details = []
+    progress = {'rows_parsed': 0, 'rows_duplicate': 0, 'rows_inserted': 0}
+    reported = time.monotonic()
+    # Lookups borrow a pooled connection per batch, like the writer's inserts,
+    # so concurrent files never hold one each while waiting for a second.
+    dedup = LeakDeduplicator(pool=get_pool(), trace=trace)
+    try:
+        batches = get_parse_executor().iter_batches(file_path, password=password, trace=trace)
+        async for batch in regroup_batches(batches, dedup.batch_size):
+            rows = await asyncio.to_thread(_ingest_batch, writer, dedup, batch)
+            artifact.write_many(rows)
+            if len(details) < details_limit:
+                details.extend(rows[:details_limit - len(details)])
+            progress = {'rows_parsed': dedup.parsed, 'rows_duplicate': dedup.duplicates, 'rows_inserted': writer.inserted}
+            if on_progress and time.monotonic() - reported >= PROGRESS_INTERVAL:
+                reported = time.monotonic()
+                on_progress(progress)
+        await asyncio.to_thread(writer.close)
+        progress['rows_inserted'] = writer.inserted
+        json_file = await asyncio.to_thread(artifact.close)
+    except Exception:
+        await asyncio.to_thread(artifact.discard)
+        raise
+    return {**progress, 'json_file': json_file, 'details': details}
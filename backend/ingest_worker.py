@@ -0,0 +1,194 @@
+import os
+import sys
+import json
+import socket
+import signal
+import asyncio
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+from urllib.parse import urlsplit
+from backend.ingest import HANDLERS, PermanentError
+from backend.metrics import get_traces, record_error, register_gauge, render_metrics
+from backend.work_queue import WORK_LEASE_SECONDS, WorkItem, get_work_queue
+
+WORKER_CONCURRENCY = int(os.getenv('INGEST_WORKER_CONCURRENCY', 2))
+WORKER_POLL_INTERVAL = float(os.getenv('INGEST_WORKER_POLL_INTERVAL', 1))
+# 0 keeps the listener off; the API process serves its own /metrics.
+WORKER_METRICS_PORT = int(os.getenv('INGEST_WORKER_METRICS_PORT', 0))
+WORKER_METRICS_HOST = os.getenv('INGEST_WORKER_METRICS_HOST', '0.0.0.0')
+
+
+class IngestWorker:
+    def __init__(self, queue=None, concurrency: int = WORKER_CONCURRENCY, kinds: List[str] = None,
+                 worker_id: str = None, lease_seconds: float = WORK_LEASE_SECONDS):
+        self.queue = queue or get_work_queue()
+        self.concurrency = concurrency
+        self.kinds = kinds
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self.tasks = []
+        self.processed = 0
+        self.failed = 0
+
+    async def _keep_lease(self, item: WorkItem, state: dict):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if not await asyncio.to_thread(self.queue.heartbeat, item, state.get('progress'), self.lease_seconds):
+                print(f"[Worker] Lost lease on {item.kind} {item.id}")
+                return
+
+    async def process(self, item: WorkItem):
+        handler = HANDLERS.get(item.kind)
+        if handler is None:
+            await asyncio.to_thread(self.queue.fail, item, f"No handler for {item.kind}", False)
+            return
+        state = {}
+
+        def on_progress(progress: dict):
+            # Called on the event loop; the write runs in a thread and a tick
+            # is dropped while the previous one is still being saved.
+            state['progress'] = progress
+            saving = state.get('saving')
+            if saving is None or saving.done():
+                state['saving'] = asyncio.ensure_future(
+                    asyncio.to_thread(self.queue.heartbeat, item, progress, self.lease_seconds)
+                )
+
+        lease = asyncio.create_task(self._keep_lease(item, state))
+        try:
+            result = await handler(item, on_progress)
+            await asyncio.to_thread(self.queue.complete, item, result)
+            self.processed += 1
+        except asyncio.CancelledError:
+            # Leave the lease to expire so another worker retries the item.
+            raise
+        except Exception as e:
+            print(f"[Worker] {item.kind} {item.id} failed (attempt {item.attempts}/{item.max_attempts}): {e}")
+            record_error(f"worker_{item.kind}")
+            self.failed += 1
+            await asyncio.to_thread(self.queue.fail, item, str(e), not isinstance(e, PermanentError))
+        finally:
+            lease.cancel()
+
+    async def _slot(self, index: int):
+        # Each slot holds leases under its own owner id so a reclaimed item is
+        # never mistaken for one this slot still owns.
+        owner = f"{self.worker_id}/{index}"
+        while True:
+            try:
+                item = await asyncio.to_thread(self.queue.claim, owner, self.kinds, self.lease_seconds)
+                if item is None:
+                    await asyncio.sleep(WORKER_POLL_INTERVAL)
+                    continue
+                await self.process(item)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # A locked queue database or a failed status write must not
+                # take the slot down with it; the lease covers the item.
+                print(f"[Worker] Slot {owner} error: {e}")
+                record_error('worker_slot')
+                await asyncio.sleep(WORKER_POLL_INTERVAL)
+
+    def start(self):
+        self.tasks = [asyncio.create_task(asyncio.to_thread(self.queue.purge))]
+        self.tasks += [asyncio.create_task(self._slot(i)) for i in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    async def run(self):
+        self.start()
+        await asyncio.gather(*self.tasks)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == '/metrics':
+            body, content_type = render_metrics().encode(), 'text/plain; version=0.0.4'
+        elif path == '/traces':
+            body, content_type = json.dumps(get_traces(), default=str).encode(), 'application/json'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int, host: str = WORKER_METRICS_HOST) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='worker-metrics', daemon=True).start()
+    print(f"[Worker] Serving /metrics and /traces on {host}:{server.server_address[1]}")
+    return server
+
+
+register_gauge('leak_work_items', "Work items by kind and status.", lambda: get_work_queue().stats(), ['kind', 'status'])
+
+
+def load_handlers():
+    # Importing the modules registers their work item handlers.
+    import backend.jobs  # noqa: F401
+    import backend.telegram_worker  # noqa: F401
+
+
+async def _main(args):
+    from backend.clickhouse_pool import close_pool, get_pool
+    from backend.ingest import ensure_leak_schema
+    from backend.parse_executor import shutdown_parse_executor
+    load_handlers()
+    try:
+        await get_pool().run_async(ensure_leak_schema)
+    except Exception as e:
+        print(f"[Worker] Could not ensure the leak schema: {e}")
+    worker = IngestWorker(concurrency=args.concurrency, kinds=args.kinds, worker_id=args.worker_id)
+    tasks = []
+    metrics_server = start_metrics_server(args.metrics_port) if args.metrics_port else None
+    if args.telegram:
+        from backend.telegram_worker import run_telegram_worker
+        tasks.append(asyncio.create_task(run_telegram_worker()))
+    worker.start()
+    print(f"[Worker] {worker.worker_id} started with {worker.concurrency} slots for {args.kinds or 'all kinds'}")
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+    print(f"[Worker] {worker.worker_id} stopping...")
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await worker.stop()
+    if metrics_server is not None:
+        metrics_server.shutdown()
+        metrics_server.server_close()
+    shutdown_parse_executor()
+    close_pool()
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Claim ingestion work from the shared queue and process it.")
+    parser.add_argument('--concurrency', type=int, default=WORKER_CONCURRENCY)
+    parser.add_argument('--kinds', nargs='+', default=None, help="Only claim these work item kinds.")
+    parser.add_argument('--worker-id', default=None)
+    parser.add_argument('--telegram', action='store_true', help="Also run the Telegram channel watcher in this process.")
+    parser.add_argument('--metrics-port', type=int, default=WORKER_METRICS_PORT,
+                        help="Serve /metrics and /traces on this port (0 disables).")
+    asyncio.run(_main(parser.parse_args(argv)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
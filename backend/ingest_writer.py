@@ -0,0 +1,97 @@
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Iterable, List
+from backend.clickhouse_pool import get_pool
+from backend.metrics import query_timer, stage_timer
+from backend.normalize import normalize_leak
+from backend.search_cache import search_cache
+from backend.work_queue import get_work_queue
+
+INSERT_BLOCK_SIZE = int(os.getenv('INSERT_BLOCK_SIZE', 100000))
+INSERT_FLUSH_INTERVAL = float(os.getenv('INSERT_FLUSH_INTERVAL', 5))
+INSERT_MAX_RETRIES = int(os.getenv('INSERT_MAX_RETRIES', 3))
+INSERT_RETRY_BACKOFF = float(os.getenv('INSERT_RETRY_BACKOFF', 0.5))
+
+LEAK_COLUMNS = ['id', 'software', 'url', 'username', 'password', 'scheme', 'host', 'domain', 'fingerprint', 'extra', 'date']
+
+
+def quote_identifier(name: str) -> str:
+    return '`' + str(name).replace('\\', '\\\\').replace('`', '\\`') + '`'
+
+
+def build_row(leak: dict, now: datetime) -> dict:
+    if 'fingerprint' not in leak:
+        leak = normalize_leak(leak)
+    return {'id': str(uuid.uuid4()), **leak, 'date': now}
+
+
+class LeakWriter:
+    def __init__(self, table: str = 'Leaked_DB', pool=None, block_size: int = INSERT_BLOCK_SIZE,
+                 flush_interval: float = INSERT_FLUSH_INTERVAL, max_retries: int = INSERT_MAX_RETRIES, trace=None,
+                 publish: bool = True):
+        self.table = table
+        self.trace = trace
+        self.pool = pool or get_pool()
+        self.block_size = block_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.publish = publish
+        self.now = datetime.utcnow()
+        self.inserted = 0
+        self._block = []
+        self._last_flush = time.monotonic()
+
+    def write(self, leak: dict) -> dict:
+        row = build_row(leak, self.now)
+        self._block.append(row)
+        if len(self._block) >= self.block_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+        return row
+
+    def write_many(self, leaks: Iterable[dict]) -> List[dict]:
+        return [self.write(leak) for leak in leaks]
+
+    def _insert_block(self, client, columns: List[str], data: List[list]):
+        with query_timer('insert'):
+            client.execute(
+                f"INSERT INTO {self.table} ({', '.join(quote_identifier(c) for c in columns)}) VALUES",
+                data,
+                columnar=True
+            )
+
+    def flush(self):
+        self._last_flush = time.monotonic()
+        if not self._block:
+            return
+        block, self._block = self._block, []
+        # Unknown keys live in the extra map, so every block has the same columns.
+        columns = LEAK_COLUMNS
+        data = [[row[col] for row in block] for col in columns]
+        with stage_timer('insert', self.trace, rows=len(block)):
+            for attempt in range(self.max_retries + 1):
+                try:
+                    with self.pool.connection() as client:
+                        self._insert_block(client, columns, data)
+                    break
+                except Exception as e:
+                    if attempt >= self.max_retries:
+                        raise
+                    print(f"[DB] Insert of {len(block)} rows failed ({e}), retrying...")
+                    time.sleep(INSERT_RETRY_BACKOFF * 2 ** attempt)
+        self.inserted += len(block)
+        search_cache.invalidate()
+        if self.publish:
+            # Other processes (the API's search cache) learn about committed inserts here.
+            get_work_queue().bump_data_version()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
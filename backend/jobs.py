@@ -0,0 +1,105 @@
+import os
+from backend.ingest import PermanentError, ingest_file, register_handler
+from backend.metrics import register_gauge, start_trace
+from backend.models import LeakEntry
+from backend.work_queue import get_work_queue
+
+JOB_WORKERS = int(os.getenv('UPLOAD_JOB_WORKERS', 2))
+JOB_QUEUE_SIZE = int(os.getenv('UPLOAD_JOB_QUEUE_SIZE', 16))
+JOB_DETAILS_LIMIT = int(os.getenv('UPLOAD_DETAILS_LIMIT', 1000))
+
+UPLOAD_KIND = 'upload'
+
+embedded_worker = None
+
+
+def submit_upload(filename: str, path: str, file_hash: str, bytes_read: int, details: bool = False) -> str:
+    return get_work_queue().enqueue(UPLOAD_KIND, {
+        'filename': filename,
+        'path': path,
+        'file_hash': file_hash,
+        'bytes_read': bytes_read,
+        'details': details,
+    })
+
+
+def queue_is_full() -> bool:
+    return get_work_queue().pending([UPLOAD_KIND]) >= JOB_QUEUE_SIZE
+
+
+def get_job(job_id: str):
+    record = get_work_queue().get(job_id)
+    if record is None or record['kind'] != UPLOAD_KIND:
+        return None
+    payload = record['payload']
+    counters = record['result'] or record['progress'] or {}
+    result = None
+    if record['status'] == 'done':
+        result = {'inserted_rows': counters['rows_inserted'], 'json_file': counters['json_file']}
+        if payload['details']:
+            result['details'] = [LeakEntry(**row) for row in counters.get('details', [])]
+    return {
+        'job_id': record['id'],
+        'filename': payload['filename'],
+        'status': record['status'],
+        'bytes_read': payload['bytes_read'],
+        'rows_parsed': counters.get('rows_parsed', 0),
+        'rows_duplicate': counters.get('rows_duplicate', 0),
+        'rows_inserted': counters.get('rows_inserted', 0),
+        'attempts': record['attempts'],
+        'error': None if record['status'] == 'done' else record['error'],
+        'result': result,
+        'created_at': record['created_at'],
+        'finished_at': record['finished_at'],
+    }
+
+
+async def handle_upload(item, on_progress) -> dict:
+    payload = item.payload
+    trace = start_trace(payload['filename'], UPLOAD_KIND)
+    try:
+        result = await ingest_file(
+            payload['path'], payload['file_hash'] or item.id, trace=trace, on_progress=on_progress,
+            details_limit=JOB_DETAILS_LIMIT if payload['details'] else 0
+        )
+        if not result['rows_parsed']:
+            raise PermanentError("No leaks found in file.")
+    except Exception as e:
+        trace.finish('failed')
+        # The spooled file is kept for as long as another attempt may need it.
+        if (isinstance(e, PermanentError) or item.last_attempt) and os.path.exists(payload['path']):
+            os.remove(payload['path'])
+        raise
+    trace.finish('done')
+    os.remove(payload['path'])
+    return result
+
+
+register_handler(UPLOAD_KIND, handle_upload)
+
+
+def _upload_counts() -> dict:
+    return {(status,): count for (kind, status), count in get_work_queue().stats().items() if kind == UPLOAD_KIND}
+
+
+register_gauge('leak_upload_queue_depth', "Upload jobs queued or running.", lambda: {(): get_work_queue().pending([UPLOAD_KIND])})
+register_gauge('leak_upload_jobs', "Upload jobs in the work queue by status.", _upload_counts, ['status'])
+
+
+def start_job_workers():
+    # The API runs a few queue workers itself so a single node needs nothing
+    # else; with UPLOAD_JOB_WORKERS=0 uploads are left to standalone
+    # `python -m backend.ingest_worker` processes.
+    global embedded_worker
+    if JOB_WORKERS <= 0:
+        return
+    from backend.ingest_worker import IngestWorker
+    embedded_worker = IngestWorker(concurrency=JOB_WORKERS)
+    embedded_worker.start()
+
+
+async def stop_job_workers():
+    global embedded_worker
+    if embedded_worker is not None:
+        await embedded_worker.stop()
+        embedded_worker = None
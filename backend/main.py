@@ -1,28 +1,55 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException
-from backend.clickhouse_util import get_clickhouse_client
-from backend.models import UploadResponse, SearchRequest, SearchResponse, LeakEntry
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from backend.clickhouse_pool import get_pool, close_pool
+from backend.models import UploadJobResponse, JobStatus, SearchRequest, SearchResponse, LeakEntry
 import os
-import uuid
-from datetime import datetime
-import shutil
-import tempfile
-import json
 import time
+import hashlib
+import aiofiles
 from backend.telegram_worker import run_telegram_worker, get_worker_status
 import asyncio
-from backend.parsing_utils import extract_and_parse
-from difflib import SequenceMatcher
+from backend.parse_executor import iter_chunks, shutdown_parse_executor
+from backend.jobs import get_job, queue_is_full, start_job_workers, stop_job_workers, submit_upload
+from backend.ingest import ensure_leak_schema
+from backend.ingest_worker import load_handlers
+from backend.work_queue import get_work_queue, spool_path
+from backend.search import (
+    EXPORT_FORMATS, SEARCH_EXPORT_BLOCK_SIZE, SEARCH_EXPORT_MAX_ROWS, SEARCH_MODES, format_export_rows,
+    iter_search, next_cursor, search_page,
+)
+from backend.search_cache import SEARCH_CACHE_ENABLED, search_cache
+from backend.metrics import get_traces, record_stage, render_metrics, stage_timer
 
 app = FastAPI(title="Leak Parser API", description="API for parsing and searching password leaks.", version="1.0.0")
 
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', 1024 * 1024))
+# Only one process should watch the Telegram channel; disable it here when a
+# dedicated `python -m backend.ingest_worker --telegram` process does.
+TG_WORKER_ENABLED = os.getenv('TG_WORKER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+load_handlers()
+
 worker_task = None
 
 @app.on_event("startup")
 async def start_telegram_worker():
     global worker_task
+    if not TG_WORKER_ENABLED:
+        return
     print("[FastAPI] Starting Telegram worker in background...")
     worker_task = asyncio.create_task(run_telegram_worker())
 
+@app.on_event("startup")
+async def start_upload_workers():
+    start_job_workers()
+
+@app.on_event("startup")
+def ensure_schema():
+    try:
+        get_pool().run(ensure_leak_schema)
+    except Exception as e:
+        print(f"[FastAPI] Could not ensure the leak schema: {e}")
+
 @app.on_event("shutdown")
 async def stop_telegram_worker():
     global worker_task
@@ -32,111 +59,148 @@ async def stop_telegram_worker():
             await worker_task
         except asyncio.CancelledError:
             pass
+    await stop_job_workers()
+    shutdown_parse_executor()
+    close_pool()
 
 @app.get("/health")
 def health_check():
     try:
-        client = get_clickhouse_client()
-        client.execute("SELECT 1")
+        get_pool().execute("SELECT 1")
         return {"status": "ok"}
     except Exception as e:
         return {"status": "error", "detail": str(e)}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/traces")
+def traces():
+    return get_traces()
+
+@app.get("/search/cache")
+def search_cache_stats():
+    return search_cache.stats()
+
 @app.get("/worker-status")
 def worker_status():
     return get_worker_status()
 
-@app.post("/upload", response_model=UploadResponse)
-async def upload_file(file: UploadFile = File(...)):
+@app.post("/upload", response_model=UploadJobResponse, status_code=202)
+async def upload_file(file: UploadFile = File(...), details: bool = False):
     allowed_exts = {'.txt', '.json', '.zip', '.rar', '.7z', '.xlsx', '.xls', '.csv'}
     suffix = os.path.splitext(file.filename)[1].lower()
     if suffix not in allowed_exts:
         raise HTTPException(status_code=400, detail=f"File type {suffix} not allowed.")
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-        temp_path = tmp.name
-        with open(temp_path, 'wb') as out:
-            shutil.copyfileobj(file.file, out)
-    leaks = extract_and_parse(temp_path)
-    os.remove(temp_path)
-    if not leaks:
-        raise HTTPException(status_code=400, detail="No leaks found in file.")
-    client = get_clickhouse_client()
-    now = datetime.utcnow()
-    clickhouse_data = []
-    for leak in leaks:
-        software = leak.get('software', '')
-        url = leak.get('url', '')
-        username = leak.get('username', '')
-        password = leak.get('password', '')
-        exists = client.execute(
-            "SELECT count() FROM Leaked_DB WHERE software=%(software)s AND url=%(url)s AND username=%(username)s AND password=%(password)s",
-            {'software': software, 'url': url, 'username': username, 'password': password}
-        )[0][0]
-        if exists:
-            continue
-        clickhouse_data.append({
-            'id': str(uuid.uuid4()),
-            'software': software,
-            'url': url,
-            'username': username,
-            'password': password,
-            'date': now,
-            **{k: v for k, v in leak.items() if k not in ['software', 'url', 'username', 'password']}
-        })
-    # Save the parsed leaks as JSON for download
-    json_dir = os.path.join(os.path.dirname(__file__), '..', 'uploads')
-    os.makedirs(json_dir, exist_ok=True)
-    base_name = os.path.splitext(os.path.basename(file.filename))[0]
-    json_name = f"{base_name}.json"
-    json_path = os.path.join(json_dir, json_name)
-    if os.path.exists(json_path):
-        json_name = f"{base_name}_{int(time.time())}.json"
-        json_path = os.path.join(json_dir, json_name)
-    with open(json_path, 'w', encoding='utf-8') as jf:
-        json.dump(clickhouse_data if clickhouse_data else leaks, jf, indent=2, default=str)
-    if not clickhouse_data:
-        return {"inserted_rows": 0, "details": [], "json_file": f"/uploads/{json_name}"}
-    # Ensure columns
-    table_columns = set(row[0] for row in client.execute(f"DESCRIBE TABLE Leaked_DB"))
-    all_columns = set()
-    for row in clickhouse_data:
-        all_columns.update(row.keys())
-    for col in all_columns - table_columns:
-        if col != 'id':
-            client.execute(f"ALTER TABLE Leaked_DB ADD COLUMN IF NOT EXISTS {col} String")
-    all_columns = list(all_columns)
-    insert_data = []
-    for row in clickhouse_data:
-        insert_data.append(tuple(row.get(col, '') if col != 'date' else row.get(col) for col in all_columns))
-    client.execute(
-        f"INSERT INTO Leaked_DB ({', '.join(all_columns)}) VALUES",
-        insert_data
-    )
-    return {"inserted_rows": len(clickhouse_data), "details": [LeakEntry(**row) for row in clickhouse_data], "json_file": f"/uploads/{json_name}"}
+    if queue_is_full():
+        raise HTTPException(status_code=503, detail="Too many uploads in progress, try again later.")
+    # Uploads are spooled where every ingest worker can read them.
+    path = spool_path(suffix)
+    digest = hashlib.sha256()
+    bytes_read = 0
+    started = time.perf_counter()
+    try:
+        async with aiofiles.open(path, 'wb') as out:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                await out.write(chunk)
+                digest.update(chunk)
+                bytes_read += len(chunk)
+        record_stage('upload', time.perf_counter() - started, nbytes=bytes_read)
+        job_id = await asyncio.to_thread(submit_upload, file.filename, path, digest.hexdigest(), bytes_read, details)
+    except Exception:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return {"job_id": job_id, "status": "queued"}
 
-def fuzzy_match(a, b):
-    return SequenceMatcher(None, a.lower(), b.lower()).ratio()
+@app.get("/jobs/{job_id}", response_model=JobStatus)
+def job_status(job_id: str):
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
 
 @app.post("/search", response_model=SearchResponse)
 async def search_leaks(request: SearchRequest):
     query = request.query.strip()
     if not query:
         return SearchResponse(results=[])
-    client = get_clickhouse_client()
-    columns = [row[0] for row in client.execute(f"DESCRIBE TABLE Leaked_DB")]
-    results = client.execute(f"SELECT {', '.join(columns)} FROM Leaked_DB LIMIT 10000")
-    formatted = [dict(zip(columns, row)) for row in results]
-    filtered = []
-    for row in formatted:
-        if 'id' in row and not isinstance(row['id'], str):
-            row['id'] = str(row['id'])
-        if 'username' in row and fuzzy_match(row['username'], query) > 0.6:
-            filtered.append(LeakEntry(**row))
-        elif 'url' in row and fuzzy_match(row['url'], query) > 0.6:
-            filtered.append(LeakEntry(**row))
-        elif 'password' in row and fuzzy_match(row['password'], query) > 0.6:
-            filtered.append(LeakEntry(**row))
-    return SearchResponse(results=filtered)
+    if request.mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"Search mode {request.mode} not supported.")
+    key = search_cache.make_key(query, request.mode, request.limit, request.offset, request.cursor)
+    if SEARCH_CACHE_ENABLED:
+        search_cache.sync(await asyncio.to_thread(get_work_queue().data_version))
+    with stage_timer('search') as measured:
+        rows = search_cache.get(key) if SEARCH_CACHE_ENABLED else None
+        partial = False
+        if rows is None:
+            version = search_cache.version
+            try:
+                rows, partial = await get_pool().run_async(
+                    search_page, query, mode=request.mode, limit=request.limit, offset=request.offset, cursor=request.cursor
+                )
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            # A page cut short by the search limits is not cached as if it were complete.
+            if SEARCH_CACHE_ENABLED and not partial:
+                search_cache.put(key, rows, version)
+        measured['rows'] = len(rows)
+    return SearchResponse(
+        results=[LeakEntry(**row) for row in rows], limit=request.limit, offset=request.offset,
+        next_cursor=next_cursor(rows, request.limit), partial=partial
+    )
+
+async def _stream_export(query: str, mode: str, fmt: str, limit: int):
+    pool = get_pool()
+    client = await asyncio.to_thread(pool.acquire)
+    batches = iter_chunks(iter_search(client, query, mode=mode, limit=limit), SEARCH_EXPORT_BLOCK_SIZE)
+    reader = None
+    finished = False
+    try:
+        header = True
+        while True:
+            with stage_timer('export') as measured:
+                # Shielded so a disconnect can't orphan the thread reading from client.
+                reader = asyncio.ensure_future(asyncio.to_thread(next, batches, None))
+                batch = await asyncio.shield(reader)
+                measured['rows'] = len(batch or [])
+            if batch is None:
+                break
+            yield format_export_rows(batch, fmt, header=header)
+            header = False
+        finished = True
+    finally:
+        if finished:
+            pool.release(client)
+        else:
+            # An abandoned execute_iter leaves unread blocks on the socket, so the
+            # connection is dropped; that also unblocks a reader thread still
+            # waiting on a block. The client only goes back to the pool once
+            # that thread has let go of it.
+            client.disconnect()
+            if reader is None or reader.done():
+                pool.release(client, broken=True)
+            else:
+                reader.add_done_callback(lambda _: pool.release(client, broken=True))
+
+@app.get("/export")
+async def export_leaks(query: str, mode: str = 'fuzzy', format: str = 'ndjson', limit: int = SEARCH_EXPORT_MAX_ROWS):
+    query = query.strip()
+    if not query:
+        raise HTTPException(status_code=400, detail="Query must not be empty.")
+    if mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"Search mode {mode} not supported.")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Export format {format} not supported.")
+    media_type = 'application/x-ndjson' if format == 'ndjson' else 'text/csv'
+    return StreamingResponse(
+        _stream_export(query, mode, format, limit), media_type=media_type,
+        headers={'Content-Disposition': f'attachment; filename="leaks.{format}"'}
+    )
 
 if __name__ == "__main__":
     import uvicorn
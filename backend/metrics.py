@@ -0,0 +1,238 @@
+import os
+import time
+import uuid
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, List
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+METRICS_TRACING = os.getenv('METRICS_TRACING', 'false').lower() in ('1', 'true', 'yes')
+METRICS_TRACE_HISTORY = int(os.getenv('METRICS_TRACE_HISTORY', 100))
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+def _label_key(labelnames: List[str], labels: dict) -> tuple:
+    return tuple(str(labels.get(name, '')) for name in labelnames)
+
+
+def _format_labels(labelnames: List[str], values: tuple, extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labelnames: List[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = list(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, _format_labels(self.labelnames, key), value) for key, value in self._values.items()]
+
+
+class Gauge:
+    kind = 'gauge'
+
+    def __init__(self, name: str, help: str, labelnames: List[str] = (), collect: Callable[[], Dict[tuple, float]] = None):
+        self.name = name
+        self.help = help
+        self.labelnames = list(labelnames)
+        self.collect = collect
+
+    def samples(self):
+        try:
+            values = self.collect() if self.collect else {}
+        except Exception:
+            values = {}
+        return [(self.name, _format_labels(self.labelnames, key), value) for key, value in values.items()]
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: List[str] = (), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = list(labelnames)
+        self.buckets = list(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                for bound, value in zip(self.buckets, counts):
+                    samples.append((f"{self.name}_bucket", _format_labels(self.labelnames, key, f'le="{bound}"'), value))
+                samples.append((f"{self.name}_bucket", _format_labels(self.labelnames, key, 'le="+Inf"'), count))
+                samples.append((f"{self.name}_sum", _format_labels(self.labelnames, key), total))
+                samples.append((f"{self.name}_count", _format_labels(self.labelnames, key), count))
+        return samples
+
+
+REGISTRY = []
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{labels} {value}")
+    return '\n'.join(lines) + '\n'
+
+
+STAGE_SECONDS = register(Histogram('leak_stage_duration_seconds', "Time spent per pipeline stage call.", ['stage']))
+STAGE_ROWS = register(Counter('leak_stage_rows_total', "Rows handled per pipeline stage.", ['stage']))
+STAGE_BYTES = register(Counter('leak_stage_bytes_total', "Bytes handled per pipeline stage.", ['stage']))
+STAGE_ERRORS = register(Counter('leak_stage_errors_total', "Failures per pipeline stage.", ['stage']))
+CLICKHOUSE_SECONDS = register(Histogram('leak_clickhouse_query_seconds', "ClickHouse query latency.", ['query']))
+
+
+def register_gauge(name: str, help: str, collect: Callable[[], Dict[tuple, float]], labelnames: List[str] = ()) -> Gauge:
+    return register(Gauge(name, help, labelnames, collect))
+
+
+def record_stage(stage: str, seconds: float = None, rows: int = 0, nbytes: int = 0):
+    if not METRICS_ENABLED:
+        return
+    if seconds is not None:
+        STAGE_SECONDS.observe(seconds, stage=stage)
+    if rows:
+        STAGE_ROWS.inc(rows, stage=stage)
+    if nbytes:
+        STAGE_BYTES.inc(nbytes, stage=stage)
+
+
+def record_error(stage: str):
+    if METRICS_ENABLED:
+        STAGE_ERRORS.inc(stage=stage)
+
+
+@contextmanager
+def stage_timer(stage: str, trace=None, rows: int = 0, nbytes: int = 0):
+    # Yields a dict so callers can fill in rows/bytes once they are known.
+    measured = {'rows': rows, 'bytes': nbytes}
+    start = time.perf_counter()
+    try:
+        yield measured
+    except Exception:
+        record_error(stage)
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        record_stage(stage, seconds, measured['rows'], measured['bytes'])
+        if trace is not None:
+            trace.add(stage, seconds, measured['rows'], measured['bytes'])
+
+
+@contextmanager
+def query_timer(query: str):
+    if not METRICS_ENABLED:
+        yield
+        return
+    with CLICKHOUSE_SECONDS.time(query=query):
+        yield
+
+
+class Trace:
+    # Per-file span log; spans for the same stage are merged so a file with
+    # thousands of batches still produces one entry per stage.
+    def __init__(self, name: str, source: str):
+        self.id = str(uuid.uuid4())
+        self.name = name
+        self.source = source
+        self.started_at = time.time()
+        self.finished_at = None
+        self.status = 'running'
+        self.spans = {}
+
+    def add(self, stage: str, seconds: float, rows: int = 0, nbytes: int = 0):
+        span = self.spans.setdefault(stage, {'seconds': 0.0, 'calls': 0, 'rows': 0, 'bytes': 0})
+        span['seconds'] += seconds
+        span['calls'] += 1
+        span['rows'] += rows
+        span['bytes'] += nbytes
+
+    def finish(self, status: str = 'done'):
+        self.status = status
+        self.finished_at = time.time()
+
+    def to_dict(self) -> dict:
+        return {
+            'trace_id': self.id,
+            'name': self.name,
+            'source': self.source,
+            'status': self.status,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'spans': {stage: {**span, 'seconds': round(span['seconds'], 6)} for stage, span in self.spans.items()},
+        }
+
+
+class _NullTrace:
+    def add(self, stage: str, seconds: float, rows: int = 0, nbytes: int = 0):
+        pass
+
+    def finish(self, status: str = 'done'):
+        pass
+
+
+traces = deque(maxlen=METRICS_TRACE_HISTORY)
+
+
+def start_trace(name: str, source: str):
+    if not METRICS_TRACING:
+        return _NullTrace()
+    trace = Trace(name, source)
+    traces.append(trace)
+    return trace
+
+
+def get_traces() -> List[dict]:
+    return [trace.to_dict() for trace in reversed(traces)]
+
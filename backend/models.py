@@ -8,15 +8,44 @@ class LeakEntry(BaseModel):
     url: Optional[str]
     username: Optional[str]
     password: Optional[str]
+    domain: Optional[str] = None
     date: Optional[datetime]
     extra: Optional[Dict[str, str]] = None
 
 class UploadResponse(BaseModel):
     inserted_rows: int
-    details: Optional[List[LeakEntry]]
+    details: Optional[List[LeakEntry]] = None
+    json_file: Optional[str] = None
+
+class UploadJobResponse(BaseModel):
+    job_id: str
+    status: str
+
+class JobStatus(BaseModel):
+    job_id: str
+    filename: str
+    status: str
+    bytes_read: int
+    rows_parsed: int
+    rows_duplicate: int
+    rows_inserted: int
+    attempts: int = 0
+    error: Optional[str] = None
+    result: Optional[UploadResponse] = None
+    created_at: float
+    finished_at: Optional[float] = None
 
 class SearchRequest(BaseModel):
     query: str
+    mode: str = 'fuzzy'
+    limit: int = 100
+    offset: int = 0
+    cursor: Optional[str] = None
 
 class SearchResponse(BaseModel):
-    results: List[LeakEntry] 
\ No newline at end of file
+    results: List[LeakEntry]
+    limit: Optional[int] = None
+    offset: Optional[int] = None
+    next_cursor: Optional[str] = None
+    # True when the search stopped at its row or time limit, so more matches may exist.
+    partial: bool = False
\ No newline at end of file
@@ -0,0 +1,102 @@
+import hashlib
+import ipaddress
+from functools import lru_cache
+from urllib.parse import urlsplit
+from backend.clickhouse_util import ensure_skip_indexes
+
+LEAK_FIELDS = ['software', 'url', 'username', 'password']
+NORMALIZED_FIELDS = ['scheme', 'host', 'domain', 'fingerprint']
+
+# Second-level labels under which registrations happen one level deeper
+# (example.co.uk, example.com.au). Not a full public suffix list, but it
+# covers the suffixes that dominate stealer logs.
+MULTI_LABEL_SUFFIXES = {
+    'ac', 'co', 'com', 'edu', 'gov', 'gob', 'net', 'org', 'ne', 'or', 'go', 'mil', 'nic', 'ltd', 'plc', 'biz', 'info',
+}
+
+# Rows written before these columns existed read fingerprint = 0; dedup
+# matches them on their credential columns instead (see dedup.py).
+NORMALIZED_SCHEMA = [
+    "ALTER TABLE Leaked_DB ADD COLUMN IF NOT EXISTS scheme LowCardinality(String) DEFAULT ''",
+    "ALTER TABLE Leaked_DB ADD COLUMN IF NOT EXISTS host String DEFAULT ''",
+    "ALTER TABLE Leaked_DB ADD COLUMN IF NOT EXISTS domain String DEFAULT ''",
+    "ALTER TABLE Leaked_DB ADD COLUMN IF NOT EXISTS fingerprint UInt64 DEFAULT 0",
+    "ALTER TABLE Leaked_DB ADD COLUMN IF NOT EXISTS extra Map(String, String)",
+]
+NORMALIZED_INDEXES = {
+    'idx_domain': "domain TYPE bloom_filter(0.01) GRANULARITY 4",
+    'idx_host': "host TYPE bloom_filter(0.01) GRANULARITY 4",
+    'idx_fingerprint': "fingerprint TYPE bloom_filter(0.001) GRANULARITY 4",
+}
+
+
+def ensure_normalized_schema(client):
+    for statement in NORMALIZED_SCHEMA:
+        client.execute(statement)
+    ensure_skip_indexes(client, NORMALIZED_INDEXES)
+
+
+def _text(value) -> str:
+    return '' if value is None else str(value).strip()
+
+
+def split_url(url: str):
+    url = url.strip()
+    if not url:
+        return '', ''
+    try:
+        parts = urlsplit(url if '://' in url else '//' + url)
+        return parts.scheme.lower(), (parts.hostname or '').rstrip('.')
+    except ValueError:
+        return '', ''
+
+
+@lru_cache(maxsize=65536)
+def registrable_domain(host: str) -> str:
+    host = host.lower().rstrip('.')
+    if not host:
+        return ''
+    try:
+        ipaddress.ip_address(host)
+        return host
+    except ValueError:
+        pass
+    labels = host.split('.')
+    if len(labels) <= 2:
+        return host
+    if len(labels[-1]) == 2 and labels[-2] in MULTI_LABEL_SUFFIXES:
+        return '.'.join(labels[-3:])
+    return '.'.join(labels[-2:])
+
+
+def credential_fingerprint(host: str, username: str, password: str) -> int:
+    digest = hashlib.blake2b(
+        '\x1f'.join((host, username, password)).encode('utf-8', 'surrogatepass'), digest_size=8
+    ).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def normalize_leak(leak: dict) -> dict:
+    url = _text(leak.get('url'))
+    username = _text(leak.get('username')).lower()
+    password = '' if leak.get('password') is None else str(leak.get('password'))
+    scheme, host = split_url(url)
+    extra = {}
+    for key, value in leak.items():
+        if key in LEAK_FIELDS or value is None:
+            continue
+        if key == 'extra' and isinstance(value, dict):
+            extra.update({str(k): str(v) for k, v in value.items()})
+        elif key not in NORMALIZED_FIELDS:
+            extra[str(key)] = str(value)
+    return {
+        'software': _text(leak.get('software')),
+        'url': url,
+        'username': username,
+        'password': password,
+        'scheme': scheme,
+        'host': host,
+        'domain': registrable_domain(host),
+        'fingerprint': credential_fingerprint(host, username, password),
+        'extra': extra,
+    }
@@ -0,0 +1,174 @@
+import os
+import time
+import heapq
+import queue
+import asyncio
+import threading
+import multiprocessing
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator, Iterable, Iterator, List
+from backend.metrics import record_stage, stage_timer
+from backend.parsing_utils import ARCHIVE_EXTS, ArchiveBudget, iter_parse_archive, iter_parse_file_by_ext, open_archive, select_archive_members
+
+PARSE_WORKERS = int(os.getenv('PARSE_WORKERS', os.cpu_count() or 1))
+PARSE_BATCH_SIZE = int(os.getenv('PARSE_BATCH_SIZE', 1000))
+PARSE_QUEUE_SIZE = int(os.getenv('PARSE_QUEUE_SIZE', 64))
+PARSE_MP_START_METHOD = os.getenv('PARSE_MP_START_METHOD', 'spawn')
+PARSE_ARCHIVE_TASK_BYTES = int(os.getenv('PARSE_ARCHIVE_TASK_BYTES', 32 * 1024 * 1024))
+PARSE_TASKS_PER_WORKER = int(os.getenv('PARSE_TASKS_PER_WORKER', 4))
+
+
+def iter_chunks(items: Iterable, size: int) -> Iterator[List]:
+    it = iter(items)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def partition_members(members: List[tuple], ext: str, workers: int = PARSE_WORKERS,
+                      task_bytes: int = PARSE_ARCHIVE_TASK_BYTES) -> List[List[tuple]]:
+    # 7z archives are usually solid, so splitting them would decompress the
+    # same stream once per task.
+    if ext == ".7z":
+        return [members] if members else []
+    if not members:
+        return []
+    # A few tasks per worker keeps every core busy even when the archive is
+    # thousands of small files; task_bytes only caps how large a task gets.
+    total = sum(size for _, size in members)
+    count = max(workers * PARSE_TASKS_PER_WORKER, -(-total // max(task_bytes, 1)))
+    count = min(len(members), count)
+    # Largest members first onto the lightest task, then archive order within a task.
+    heap = [(0, i) for i in range(count)]
+    groups = [[] for _ in range(count)]
+    for index in sorted(range(len(members)), key=lambda i: members[i][1], reverse=True):
+        size, group = heapq.heappop(heap)
+        groups[group].append(index)
+        heapq.heappush(heap, (size + members[index][1], group))
+    return [[members[i] for i in sorted(group)] for group in groups if group]
+
+
+def list_members_for_tasks(file_path: str, ext: str, password: str = None, workers: int = PARSE_WORKERS):
+    budget = ArchiveBudget()
+    try:
+        with open_archive(file_path, ext, password) as archive:
+            members = select_archive_members(archive, ext, budget)
+    except Exception as e:
+        print(f"Error reading archive {file_path}: {e}")
+        return [], budget
+    return partition_members(members, ext, workers), budget
+
+
+def _parse_into_queue(file_path: str, out_queue, batch_size: int, ext: str = None, password: str = None,
+                      members: List[tuple] = None, budget_bytes: int = None):
+    # Runs in a pool process; the None sentinel tells the reader this task is done.
+    try:
+        if members is not None:
+            leaks = iter_parse_archive(file_path, ext, password, members=members, budget=ArchiveBudget(budget_bytes))
+        else:
+            leaks = iter_parse_file_by_ext(file_path)
+        for batch in iter_chunks(leaks, batch_size):
+            out_queue.put(batch)
+    finally:
+        out_queue.put(None)
+
+
+class ParseExecutor:
+    def __init__(self, max_workers: int = PARSE_WORKERS, batch_size: int = PARSE_BATCH_SIZE,
+                 queue_size: int = PARSE_QUEUE_SIZE, start_method: str = PARSE_MP_START_METHOD):
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self._context = multiprocessing.get_context(start_method)
+        self._pool = None
+        self._manager = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=self._context)
+                self._manager = self._context.Manager()
+            return self._pool
+
+    async def _fan_out(self, tasks: List[dict], trace=None) -> AsyncIterator[List[dict]]:
+        pool = self._get_pool()
+        out_queue = self._manager.Queue(maxsize=self.queue_size)
+        futures = [pool.submit(_parse_into_queue, out_queue=out_queue, batch_size=self.batch_size, **task) for task in tasks]
+        remaining = len(futures)
+        try:
+            while remaining:
+                # Time spent waiting on the workers is what parsing costs the consumer.
+                waited = time.perf_counter()
+                try:
+                    batch = await asyncio.to_thread(out_queue.get, True, 1.0)
+                except queue.Empty:
+                    if all(f.done() for f in futures):
+                        break
+                    continue
+                if batch is None:
+                    remaining -= 1
+                    continue
+                waited = time.perf_counter() - waited
+                record_stage('parse', waited, rows=len(batch))
+                if trace is not None:
+                    trace.add('parse', waited, rows=len(batch))
+                yield batch
+        finally:
+            # If the consumer stopped early, unblock workers stuck on a full queue.
+            for f in futures:
+                f.cancel()
+            while not all(f.done() for f in futures):
+                try:
+                    out_queue.get_nowait()
+                except queue.Empty:
+                    await asyncio.sleep(0.05)
+            for task, f in zip(tasks, futures):
+                if not f.cancelled() and f.exception() is not None:
+                    print(f"[Parsing] Failed to parse {task['file_path']}: {f.exception()}")
+
+    async def iter_batches(self, file_path: str, password: str = None, trace=None) -> AsyncIterator[List[dict]]:
+        ext = os.path.splitext(file_path)[1].lower()
+        if ext in ARCHIVE_EXTS:
+            # Members are streamed straight from the archive inside the pool
+            # processes; each task opens its own handle on the same file.
+            with stage_timer('extract', trace, nbytes=os.path.getsize(file_path)):
+                groups, budget = await asyncio.to_thread(list_members_for_tasks, file_path, ext, password, self.max_workers)
+            share = budget.remaining // max(len(groups), 1)
+            tasks = [
+                {'file_path': file_path, 'ext': ext, 'password': password, 'members': group, 'budget_bytes': share}
+                for group in groups
+            ]
+        else:
+            tasks = [{'file_path': file_path}]
+        if tasks:
+            async for batch in self._fan_out(tasks, trace):
+                yield batch
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._manager.shutdown()
+                self._pool = None
+                self._manager = None
+
+
+_executor = None
+
+
+def get_parse_executor() -> ParseExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ParseExecutor()
+    return _executor
+
+
+def shutdown_parse_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown()
+        _executor = None
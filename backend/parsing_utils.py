@@ -1,33 +1,23 @@
 import os
-import re
-import json
+import io
 import zipfile
 import rarfile
 import py7zr
-from typing import List
+import py7zr.io
+from typing import Iterator, List
 import pandas as pd
 from difflib import get_close_matches
 import shutil
-import asyncio
+import tempfile
+from backend.text_formats import (
+    CUSTOM_BLOCK_PATTERN, LEAK_PATTERN, iter_json_stream, iter_leaks_from_text_stream, iter_pattern_stream,
+)
+
+TABLE_CHUNK_SIZE = int(os.getenv('PARSE_TABLE_CHUNK_SIZE', 50000))
+EMAIL_SAMPLE_SIZE = int(os.getenv('PARSE_EMAIL_SAMPLE_SIZE', 1000))
 
 def parse_leaks_from_text(text: str) -> List[dict]:
-    leak_pattern = re.compile(
-        r"SOFT:\s*(?P<software>.+?)\s*\n(?:URL|HOST):\s*(?P<url>.+?)\s*\nUSER:\s*(?P<username>.+?)\s*\nPASS:\s*(?P<password>.+?)(?:\n|$)",
-        re.DOTALL | re.IGNORECASE
-    )
-    leaks = []
-    for match in leak_pattern.finditer(text):
-        leaks.append(match.groupdict())
-    return leaks
-
-def parse_leaks_from_json(data: str) -> List[dict]:
-    try:
-        items = json.loads(data)
-        if isinstance(items, list):
-            return items
-    except Exception:
-        pass
-    return []
+    return list(iter_pattern_stream(io.StringIO(text), LEAK_PATTERN))
 
 def fuzzy_column(columns, targets, cutoff=0.4):
     columns_lower = [c.lower() for c in columns]
@@ -40,121 +30,208 @@ def fuzzy_column(columns, targets, cutoff=0.4):
                 return col
     return None
 
-def detect_email_column(df):
-    for col in df.columns:
-        if df[col].astype(str).str.contains(r'@', na=False).sum() > 0:
+def detect_email_column(df, sample_size: int = EMAIL_SAMPLE_SIZE):
+    sample = df.head(sample_size)
+    for col in sample.columns:
+        if pd.api.types.is_numeric_dtype(sample[col]):
+            continue
+        if sample[col].astype(str).str.contains('@', regex=False, na=False).any():
             return col
     return None
 
-def parse_leaks_from_table(df) -> List[dict]:
-    leaks = []
+def resolve_table_columns(df) -> dict:
     columns = list(df.columns)
-    software_col = fuzzy_column(columns, ['software', 'soft', 'app', 'browser', 'platform', 'source'])
-    url_col = fuzzy_column(columns, ['url', 'host', 'website', 'site', 'link', 'profile_url', 'profile'])
-    username_col = fuzzy_column(columns, ['username', 'user', 'login', 'email', 'mail', 'account', 'name'])
-    password_col = fuzzy_column(columns, ['password', 'pass', 'pwd', 'hash', 'pwd_hash'])
-
-    if not username_col:
-        username_col = detect_email_column(df)
+    resolved = {
+        'software': fuzzy_column(columns, ['software', 'soft', 'app', 'browser', 'platform', 'source']),
+        'url': fuzzy_column(columns, ['url', 'host', 'website', 'site', 'link', 'profile_url', 'profile']),
+        'username': fuzzy_column(columns, ['username', 'user', 'login', 'email', 'mail', 'account', 'name']),
+        'password': fuzzy_column(columns, ['password', 'pass', 'pwd', 'hash', 'pwd_hash']),
+    }
+    if not resolved['username']:
+        resolved['username'] = detect_email_column(df)
+    return resolved
+
+def normalize_table_frame(df, resolved: dict):
+    frame = df.copy(deep=False)
+    frame['software'] = df[resolved['software']] if resolved['software'] else 'LinkedIn'
+    for field in ['url', 'username', 'password']:
+        frame[field] = df[resolved[field]] if resolved[field] else ''
+    non_empty = (frame.astype(str).apply(lambda col: col.str.strip()) != '').sum(axis=1)
+    return frame[non_empty >= 2]
+
+def iter_table_frames(source, ext: str = None):
+    ext = ext or os.path.splitext(source)[1].lower()
+    if ext == ".csv":
+        frames = pd.read_csv(source, chunksize=TABLE_CHUNK_SIZE)
+    else:
+        if not isinstance(source, str) and not source.seekable():
+            source = io.BytesIO(source.read())
+        frames = [pd.read_excel(source)]
+    # Columns are resolved once from the first frame and reused for the rest.
+    resolved = None
+    for df in frames:
+        if resolved is None:
+            resolved = resolve_table_columns(df)
+        yield normalize_table_frame(df, resolved)
+
+def iter_leaks_from_table_file(source, ext: str = None) -> Iterator[dict]:
+    try:
+        for frame in iter_table_frames(source, ext):
+            yield from frame.to_dict('records')
+    except Exception:
+        return
 
-    for _, row in df.iterrows():
-        leak = {}
-        for col in columns:
-            leak[col] = row.get(col, '')
-        leak['software'] = row.get(software_col, 'LinkedIn') if software_col else 'LinkedIn'
-        leak['url'] = row.get(url_col, '') if url_col else ''
-        leak['username'] = row.get(username_col, '') if username_col else ''
-        leak['password'] = row.get(password_col, '') if password_col else ''
-        non_empty = sum(1 for v in leak.values() if str(v).strip())
-        if non_empty >= 2:
-            leaks.append(leak)
-    return leaks
+def parse_leaks_from_table(df) -> List[dict]:
+    return normalize_table_frame(df, resolve_table_columns(df)).to_dict('records')
 
 def parse_leaks_from_excel(file_path: str) -> List[dict]:
-    try:
-        df = pd.read_excel(file_path)
-        return parse_leaks_from_table(df)
-    except Exception:
-        return []
+    return list(iter_leaks_from_table_file(file_path))
 
 def parse_leaks_from_csv(file_path: str) -> List[dict]:
-    try:
-        df = pd.read_csv(file_path)
-        return parse_leaks_from_table(df)
-    except Exception:
-        return []
+    return list(iter_leaks_from_table_file(file_path))
 
 def parse_leaks_from_custom_blocks(text: str) -> List[dict]:
-    block_pattern = re.compile(
-        r"URL:\s*(?P<url>.+?)\s*\nUsername:\s*(?P<username>.+?)\s*\nPassword:\s*(?P<password>.+?)\s*\nApplication:\s*(?P<software>.+?)\s*\n=+",
-        re.DOTALL | re.IGNORECASE
-    )
-    leaks = []
-    for match in block_pattern.finditer(text):
-        leaks.append(match.groupdict())
-    return leaks
+    return list(iter_pattern_stream(io.StringIO(text), CUSTOM_BLOCK_PATTERN))
 
-def _parse_file_by_ext(file_path: str) -> List[dict]:
-    leaks = []
-    ext = os.path.splitext(file_path)[1].lower()
+def iter_parse_stream(name: str, stream) -> Iterator[dict]:
+    ext = os.path.splitext(name)[1].lower()
     if ext == ".json":
-        with open(file_path, 'r', encoding='utf-8') as f:
-            leaks.extend(parse_leaks_from_json(f.read()))
-    elif ext in [".xlsx", ".xls"]:
-        leaks.extend(parse_leaks_from_excel(file_path))
-    elif ext == ".csv":
-        leaks.extend(parse_leaks_from_csv(file_path))
+        try:
+            yield from iter_json_stream(io.TextIOWrapper(stream, encoding='utf-8'))
+        except UnicodeDecodeError:
+            return
+    elif ext in [".xlsx", ".xls", ".csv"]:
+        yield from iter_leaks_from_table_file(stream, ext)
     else:
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                leaks.extend(parse_leaks_from_text(content))
-                leaks.extend(parse_leaks_from_custom_blocks(content))
-        except Exception:
-            pass
-    return leaks
-
-async def _parse_file_async(file_path: str) -> List[dict]:
-    return _parse_file_by_ext(file_path)
-
-async def extract_and_parse(file_path: str, password: str = None) -> List[dict]:
-    leaks = []
-    ext = os.path.splitext(file_path)[1].lower()
-    temp_dir = None
+            yield from iter_leaks_from_text_stream(io.TextIOWrapper(stream, encoding='utf-8'))
+        except UnicodeDecodeError:
+            return
+
+def iter_parse_file_by_ext(file_path: str) -> Iterator[dict]:
+    with open(file_path, 'rb') as f:
+        yield from iter_parse_stream(file_path, f)
+
+def _parse_file_by_ext(file_path: str) -> List[dict]:
+    return list(iter_parse_file_by_ext(file_path))
+
+ARCHIVE_EXTS = [".zip", ".rar", ".7z"]
+ARCHIVE_MAX_DEPTH = int(os.getenv('ARCHIVE_MAX_DEPTH', 3))
+ARCHIVE_MAX_MEMBER_SIZE = int(os.getenv('ARCHIVE_MAX_MEMBER_SIZE', 512 * 1024 * 1024))
+ARCHIVE_MAX_TOTAL_SIZE = int(os.getenv('ARCHIVE_MAX_TOTAL_SIZE', 8 * 1024 * 1024 * 1024))
+ARCHIVE_SPOOL_SIZE = int(os.getenv('ARCHIVE_SPOOL_SIZE', 64 * 1024 * 1024))
+ARCHIVE_7Z_BATCH_BYTES = int(os.getenv('ARCHIVE_7Z_BATCH_BYTES', 64 * 1024 * 1024))
+PARSEABLE_EXTS = [".txt", ".log", ".json", ".csv", ".xlsx", ".xls", ""]
+SKIP_MEMBER_KEYWORDS = ['cookie']
+
+class ArchiveBudget:
+    def __init__(self, limit: int = ARCHIVE_MAX_TOTAL_SIZE):
+        self.remaining = limit
+
+    def take(self, size: int) -> bool:
+        if size > self.remaining:
+            return False
+        self.remaining -= size
+        return True
+
+def should_parse_member(name: str, size: int) -> bool:
+    # Decided from the archive listing, before anything is decompressed.
+    if size > ARCHIVE_MAX_MEMBER_SIZE:
+        return False
+    lower = name.lower()
+    ext = os.path.splitext(lower)[1]
+    if ext in ARCHIVE_EXTS:
+        return True
+    if ext not in PARSEABLE_EXTS:
+        return False
+    return not any(keyword in lower for keyword in SKIP_MEMBER_KEYWORDS)
+
+def open_archive(source, ext: str, password: str = None):
+    if ext == ".zip":
+        return zipfile.ZipFile(source, 'r')
+    if ext == ".rar":
+        archive = rarfile.RarFile(source)
+        if password:
+            archive.setpassword(password)
+        return archive
+    return py7zr.SevenZipFile(source, mode='r', password=password)
+
+def list_archive_members(archive, ext: str) -> List[tuple]:
+    if ext == ".7z":
+        return [(info.filename, info.uncompressed) for info in archive.list() if not info.is_directory]
+    return [(info.filename, info.file_size) for info in archive.infolist() if not info.is_dir()]
+
+def iter_archive_member_streams(archive, ext: str, members: List[tuple], password: str = None):
+    if ext == ".zip":
+        pwd = password.encode() if password else None
+        for name, _ in members:
+            with archive.open(name, pwd=pwd) as stream:
+                yield name, stream
+    elif ext == ".rar":
+        for name, _ in members:
+            with archive.open(name) as stream:
+                yield name, stream
+    else:
+        # 7z has no per-member streaming; members are decompressed into memory
+        # in bounded groups instead of onto disk.
+        group, group_size = [], 0
+        for i, (name, size) in enumerate(members):
+            group.append(name)
+            group_size += size
+            if group_size < ARCHIVE_7Z_BATCH_BYTES and i < len(members) - 1:
+                continue
+            factory = py7zr.io.BytesIOFactory(ARCHIVE_MAX_MEMBER_SIZE)
+            archive.reset()
+            archive.extract(targets=group, factory=factory)
+            for target in group:
+                product = factory.products.get(target)
+                if product is not None:
+                    product.seek(0)
+                    yield target, io.BytesIO(product.read())
+            group, group_size = [], 0
+
+def select_archive_members(archive, ext: str, budget: ArchiveBudget) -> List[tuple]:
+    selected = []
+    for name, size in list_archive_members(archive, ext):
+        if not should_parse_member(name, size):
+            continue
+        if not budget.take(size):
+            print(f"Archive size limit reached, skipping remaining members after {name}")
+            break
+        selected.append((name, size))
+    return selected
+
+def iter_parse_archive(source, ext: str, password: str = None, members: List[tuple] = None,
+                       depth: int = 0, budget: ArchiveBudget = None) -> Iterator[dict]:
+    if depth > ARCHIVE_MAX_DEPTH:
+        print(f"Skipping nested archive beyond depth {ARCHIVE_MAX_DEPTH}")
+        return
+    budget = budget or ArchiveBudget()
     try:
-        if ext in [".zip", ".rar", ".7z"]:
-            temp_dir = tempfile.mkdtemp()
-            if ext == ".zip":
-                with zipfile.ZipFile(file_path, 'r') as zf:
-                    zf.extractall(temp_dir)
-            elif ext == ".rar":
+        with open_archive(source, ext, password) as archive:
+            if members is None:
+                members = select_archive_members(archive, ext, budget)
+            for name, stream in iter_archive_member_streams(archive, ext, members, password):
+                member_ext = os.path.splitext(name)[1].lower()
                 try:
-                    with rarfile.RarFile(file_path, pwd=password.encode() if password else None) as rf:
-                        rf.extractall(temp_dir)
-                except rarfile.RarWrongPassword:
-                    print(f"Wrong password for RAR file: {file_path}")
-                    return []
+                    if member_ext in ARCHIVE_EXTS:
+                        # Nested archives need a seekable handle; small ones stay in memory.
+                        with tempfile.SpooledTemporaryFile(max_size=ARCHIVE_SPOOL_SIZE) as nested:
+                            shutil.copyfileobj(stream, nested)
+                            nested.seek(0)
+                            yield from iter_parse_archive(nested, member_ext, password, depth=depth + 1, budget=budget)
+                    else:
+                        yield from iter_parse_stream(name, stream)
                 except Exception as e:
-                    print(f"Error extracting RAR file {file_path}: {e}")
-                    return []
-            elif ext == ".7z":
-                with py7zr.SevenZipFile(file_path, mode='r') as z:
-                    z.extractall(path=temp_dir)
-
-            tasks = []
-            for root, dirs, files in os.walk(temp_dir):
-                for name in files:
-                    fpath = os.path.join(root, name)
-                    tasks.append(_parse_file_async(fpath))
-
-            results = await asyncio.gather(*tasks)
-            for r in results:
-                leaks.extend(r)
-
-        else:
-            leaks.extend(_parse_file_by_ext(file_path))
-
-    finally:
-        if temp_dir and os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
-    return leaks
+                    print(f"Error parsing archive member {name}: {e}")
+    except rarfile.RarWrongPassword:
+        print(f"Wrong password for RAR archive: {source}")
+    except Exception as e:
+        print(f"Error reading archive {source}: {e}")
+
+def iter_extract_and_parse(file_path: str, password: str = None) -> Iterator[dict]:
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext in ARCHIVE_EXTS:
+        yield from iter_parse_archive(file_path, ext, password)
+    else:
+        yield from iter_parse_file_by_ext(file_path)
@@ -0,0 +1,210 @@
+import os
+import io
+import csv
+import json
+import base64
+from datetime import datetime
+from typing import Iterator, List, Tuple
+from backend.clickhouse_util import ensure_skip_indexes
+from backend.metrics import query_timer
+from backend.normalize import registrable_domain, split_url
+
+SEARCH_FIELDS = ['username', 'url', 'password']
+SEARCH_MODES = ['exact', 'prefix', 'contains', 'fuzzy', 'domain']
+SEARCH_RESULT_COLUMNS = ['id', 'software', 'url', 'username', 'password', 'domain', 'extra', 'date']
+SEARCH_DEFAULT_LIMIT = int(os.getenv('SEARCH_DEFAULT_LIMIT', 100))
+SEARCH_MAX_LIMIT = int(os.getenv('SEARCH_MAX_LIMIT', 1000))
+SEARCH_EXPORT_MAX_ROWS = int(os.getenv('SEARCH_EXPORT_MAX_ROWS', 1000000))
+SEARCH_EXPORT_BLOCK_SIZE = int(os.getenv('SEARCH_EXPORT_BLOCK_SIZE', 10000))
+SEARCH_FUZZY_THRESHOLD = float(os.getenv('SEARCH_FUZZY_THRESHOLD', 0.6))
+SEARCH_FUZZY_PIECES = int(os.getenv('SEARCH_FUZZY_PIECES', 2))
+SEARCH_FUZZY_MIN_PIECE = int(os.getenv('SEARCH_FUZZY_MIN_PIECE', 4))
+SEARCH_FUZZY_SHORT_PIECE = int(os.getenv('SEARCH_FUZZY_SHORT_PIECE', 2))
+SEARCH_FUZZY_MAX_EDITS = int(os.getenv('SEARCH_FUZZY_MAX_EDITS', 1))
+SEARCH_MAX_ROWS_TO_READ = int(os.getenv('SEARCH_MAX_ROWS_TO_READ', 50000000))
+SEARCH_MAX_EXECUTION_TIME = int(os.getenv('SEARCH_MAX_EXECUTION_TIME', 10))
+NGRAM_SIZE = 3
+EXPORT_FORMATS = ['ndjson', 'csv']
+
+# ngrambf_v1 indexes over lower(<field>) serve the LIKE and equality
+# predicates build_search_query emits, fuzzy candidates included.
+SEARCH_INDEXES = {
+    f"idx_{field}_ngram": f"lower({field}) TYPE ngrambf_v1({NGRAM_SIZE}, 65536, 3, 0) GRANULARITY 4"
+    for field in SEARCH_FIELDS
+}
+
+# A search that the indexes cannot narrow down returns what it found within
+# these limits instead of scanning the whole table.
+SEARCH_SETTINGS = {
+    'max_rows_to_read': SEARCH_MAX_ROWS_TO_READ,
+    'read_overflow_mode': 'break',
+    'max_execution_time': SEARCH_MAX_EXECUTION_TIME,
+    'timeout_overflow_mode': 'break',
+}
+
+
+def ensure_search_indexes(client):
+    ensure_skip_indexes(client, SEARCH_INDEXES)
+
+
+def _escape_like(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def is_short_fuzzy_query(query: str) -> bool:
+    return len(query) < SEARCH_FUZZY_PIECES * SEARCH_FUZZY_MIN_PIECE
+
+
+def fuzzy_pieces(query: str, pieces: int = SEARCH_FUZZY_PIECES) -> List[str]:
+    # A value within (pieces - 1) edits of the query still contains one of
+    # `pieces` disjoint slices of it verbatim. Each slice is a LIKE the n-gram
+    # index can prune on, unlike single common trigrams ("com", "mai").
+    # Short queries get shorter slices, which the caller confirms with an
+    # edit distance since n-gram scores say little at that length.
+    size = SEARCH_FUZZY_SHORT_PIECE if is_short_fuzzy_query(query) else SEARCH_FUZZY_MIN_PIECE
+    pieces = min(pieces, len(query) // max(size, 1))
+    if pieces < 2:
+        return []
+    bounds = [len(query) * i // pieces for i in range(pieces + 1)]
+    return [query[bounds[i]:bounds[i + 1]] for i in range(pieces)]
+
+
+def encode_cursor(row: dict) -> str:
+    date = row['date'].isoformat() if isinstance(row['date'], datetime) else row['date']
+    payload = json.dumps([row['score'], date, row['id']]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        score, date, row_id = json.loads(payload)
+        return {'c_score': float(score), 'c_date': datetime.fromisoformat(date), 'c_id': str(row_id)}
+    except Exception:
+        raise ValueError("Invalid search cursor")
+
+
+def next_cursor(rows: List[dict], limit: int):
+    if not rows or len(rows) < max(1, min(int(limit), SEARCH_MAX_LIMIT)):
+        return None
+    return encode_cursor(rows[-1])
+
+
+def build_search_query(query: str, mode: str = 'fuzzy', limit: int = SEARCH_DEFAULT_LIMIT, offset: int = 0,
+                       cursor: str = None, max_limit: int = SEARCH_MAX_LIMIT):
+    q = query.strip().lower()
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode: {mode}")
+    limit = max(1, min(int(limit), max_limit))
+    offset = max(0, int(offset))
+    params = {
+        'q': q,
+        'prefix': _escape_like(q) + '%',
+        'contains': '%' + _escape_like(q) + '%',
+        'threshold': SEARCH_FUZZY_THRESHOLD,
+        'max_edits': SEARCH_FUZZY_MAX_EDITS,
+        'max_length': len(q) + SEARCH_FUZZY_MAX_EDITS,
+        'limit': limit,
+        'offset': offset,
+    }
+
+    conditions = []
+    fuzzy_conditions = []
+    pieces = fuzzy_pieces(q) if mode == 'fuzzy' else []
+    short = is_short_fuzzy_query(q)
+    for i, piece in enumerate(pieces):
+        params[f'piece{i}'] = '%' + _escape_like(piece) + '%'
+    if mode == 'domain':
+        # Served by the bloom-filter indexes on the normalized host/domain columns.
+        params['host'] = split_url(q)[1] or q
+        params['domain'] = registrable_domain(params['host'])
+        conditions.append("domain = %(domain)s OR host = %(host)s")
+    else:
+        for field in SEARCH_FIELDS:
+            column = f"lower({field})"
+            if mode == 'exact':
+                conditions.append(f"{column} = %(q)s")
+            elif mode == 'prefix':
+                conditions.append(f"{column} LIKE %(prefix)s")
+            else:
+                conditions.append(f"{column} LIKE %(contains)s")
+                if not pieces:
+                    continue
+                candidate = ' OR '.join(f"{column} LIKE %(piece{i})s" for i in range(len(pieces)))
+                if short:
+                    candidate = (
+                        f"({candidate}) AND lengthUTF8({column}) <= %(max_length)s "
+                        f"AND damerauLevenshteinDistance({column}, %(q)s) <= %(max_edits)s"
+                    )
+                fuzzy_conditions.append(f"({candidate})")
+    where = ' OR '.join(conditions)
+    if fuzzy_conditions and short:
+        where += f" OR {' OR '.join(fuzzy_conditions)}"
+    elif fuzzy_conditions:
+        # Substring hits always qualify; fuzzy candidates only above the threshold.
+        where += f" OR (({' OR '.join(fuzzy_conditions)}) AND score >= %(threshold)s)"
+    if cursor:
+        # Keyset pagination: resume strictly after the last row of the previous page.
+        params.update(decode_cursor(cursor))
+        params['offset'] = 0
+        where = (
+            f"({where}) AND (score < %(c_score)s OR (score = %(c_score)s AND "
+            f"(date < %(c_date)s OR (date = %(c_date)s AND toString(id) < %(c_id)s))))"
+        )
+
+    if mode == 'domain':
+        score = "1 + (host = %(host)s)"
+    else:
+        similarity = ', '.join(f"1 - ngramDistanceUTF8(lower({field}), %(q)s)" for field in SEARCH_FIELDS)
+        exact = ' OR '.join(f"lower({field}) = %(q)s" for field in SEARCH_FIELDS)
+        score = f"greatest({similarity}) + ({exact})"
+
+    columns = ', '.join('toString(id)' if c == 'id' else c for c in SEARCH_RESULT_COLUMNS)
+    sql = (
+        f"SELECT {columns}, {score} AS score FROM Leaked_DB "
+        f"WHERE {where} "
+        f"ORDER BY score DESC, date DESC, toString(id) DESC "
+        f"LIMIT %(limit)s OFFSET %(offset)s"
+    )
+    return sql, params
+
+
+def hit_search_limits(client) -> bool:
+    # In break mode ClickHouse returns whatever it found when a limit is hit,
+    # which is only visible from the progress of the last query.
+    last = getattr(client, 'last_query', None)
+    if last is None:
+        return False
+    return last.progress.rows >= SEARCH_MAX_ROWS_TO_READ or last.elapsed >= SEARCH_MAX_EXECUTION_TIME
+
+
+def search_page(client, query: str, mode: str = 'fuzzy', limit: int = SEARCH_DEFAULT_LIMIT, offset: int = 0,
+                cursor: str = None) -> Tuple[List[dict], bool]:
+    sql, params = build_search_query(query, mode=mode, limit=limit, offset=offset, cursor=cursor)
+    with query_timer('search'):
+        rows = client.execute(sql, params, settings=SEARCH_SETTINGS)
+    partial = hit_search_limits(client)
+    return [dict(zip(SEARCH_RESULT_COLUMNS + ['score'], row)) for row in rows], partial
+
+
+def search(client, query: str, mode: str = 'fuzzy', limit: int = SEARCH_DEFAULT_LIMIT, offset: int = 0,
+           cursor: str = None) -> List[dict]:
+    return search_page(client, query, mode=mode, limit=limit, offset=offset, cursor=cursor)[0]
+
+
+def iter_search(client, query: str, mode: str = 'fuzzy', limit: int = SEARCH_EXPORT_MAX_ROWS) -> Iterator[dict]:
+    sql, params = build_search_query(query, mode=mode, limit=limit, max_limit=SEARCH_EXPORT_MAX_ROWS)
+    rows = client.execute_iter(sql, params, settings={'max_block_size': SEARCH_EXPORT_BLOCK_SIZE})
+    for row in rows:
+        yield dict(zip(SEARCH_RESULT_COLUMNS, row))
+
+
+def format_export_rows(rows: List[dict], fmt: str, header: bool = False) -> str:
+    if fmt == 'ndjson':
+        return ''.join(json.dumps(row, default=str, ensure_ascii=False) + '\n' for row in rows)
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=SEARCH_RESULT_COLUMNS, extrasaction='ignore')
+    if header:
+        writer.writeheader()
+    writer.writerows(rows)
+    return out.getvalue()
@@ -0,0 +1,116 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import List
+from backend.metrics import register_gauge
+
+SEARCH_CACHE_ENABLED = os.getenv('SEARCH_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', 1024))
+SEARCH_CACHE_MAX_BYTES = int(os.getenv('SEARCH_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+SEARCH_CACHE_TTL = float(os.getenv('SEARCH_CACHE_TTL', 300))
+
+ROW_OVERHEAD = 256
+
+
+def estimate_size(rows: List[dict]) -> int:
+    size = 0
+    for row in rows:
+        size += ROW_OVERHEAD
+        for value in row.values():
+            size += len(value) if isinstance(value, str) else 32
+    return size
+
+
+class SearchCache:
+    def __init__(self, max_entries: int = SEARCH_CACHE_MAX_ENTRIES, max_bytes: int = SEARCH_CACHE_MAX_BYTES,
+                 ttl: float = SEARCH_CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+        self.external_version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(query: str, mode: str, limit: int, offset: int, cursor: str = None) -> tuple:
+        return query.strip().lower(), mode, int(limit), int(offset), cursor
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self.bytes -= entry[3]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                version, expires, rows, _ = entry
+                if version == self.version and expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return rows
+                self._drop(key)
+            self.misses += 1
+            return None
+
+    def put(self, key, rows: List[dict], version: int):
+        size = estimate_size(rows)
+        with self._lock:
+            # A result computed before the latest insert may already be stale.
+            if version != self.version or size > self.max_bytes:
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (version, time.monotonic() + self.ttl, rows, size)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+            self.bytes = 0
+
+    def sync(self, external_version: int):
+        # Inserts made by worker processes never reach this process's
+        # invalidate(); they bump a shared counter we compare against instead.
+        with self._lock:
+            if external_version == self.external_version:
+                return
+            changed = self.external_version is not None
+            self.external_version = external_version
+        if changed:
+            self.invalidate()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': SEARCH_CACHE_ENABLED,
+                'version': self.version,
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+search_cache = SearchCache()
+
+register_gauge(
+    'leak_search_cache', "Search result cache counters.",
+    lambda: {(k,): v for k, v in search_cache.stats().items() if k in ('hits', 'misses', 'evictions', 'entries', 'bytes', 'hit_rate')},
+    ['stat']
+)
@@ -1,14 +1,17 @@
 import os
 from datetime import datetime
-from telethon import TelegramClient
+from telethon import TelegramClient, events
+from telethon.utils import get_peer_id
 from telethon.tl.types import MessageMediaDocument
 import tempfile
-import json
-import uuid
-from backend.clickhouse_util import get_clickhouse_client
-from backend.parsing_utils import extract_and_parse
+from backend.ingest import ingest_file, register_handler
+from backend.metrics import record_error, register_gauge, stage_timer, start_trace
+from backend.checkpoint_store import ChannelCheckpoint, file_sha256, get_checkpoint_store
+from backend.work_queue import get_work_queue, spool_file
 import asyncio
 import re
+import time
+from collections import deque
 
 # Telegram API credentials
 api_id = int(os.getenv('TG_API_ID', '24451053'))
@@ -19,17 +22,66 @@ target_channels = [
     -1001585778611,
 ]
 WORKER_COUNT = int(os.getenv('TG_WORKER_COUNT', 4))
+DOWNLOAD_CONCURRENCY = int(os.getenv('TG_DOWNLOAD_CONCURRENCY', 4))
+PARSE_QUEUE_SIZE = int(os.getenv('TG_PARSE_QUEUE_SIZE', WORKER_COUNT * 2))
+LIVE_MODE = os.getenv('TG_LIVE_MODE', 'true').lower() in ('1', 'true', 'yes')
+POLL_INTERVAL = float(os.getenv('TG_POLL_INTERVAL', 300))
+ERROR_HISTORY = int(os.getenv('TG_ERROR_HISTORY', 100))
+RECONCILE_INTERVAL = float(os.getenv('TG_RECONCILE_INTERVAL', 2))
+
+TELEGRAM_FILE_KIND = 'telegram_file'
 
 worker_status = {
     'running': False,
     'last_checked': None,
     'last_file': None,
     'inserted_leaks': 0,
-    'errors': []
+    'errors': deque(maxlen=ERROR_HISTORY)
+}
+
+pipeline_stats = {
+    'started_at': None,
+    'downloads': 0,
+    'download_bytes': 0,
+    'active_downloads': 0,
+    'parsed_files': 0,
+    'parsed_rows': 0,
 }
+parse_queues = {}
+
+def reset_pipeline_stats():
+    for key in pipeline_stats:
+        pipeline_stats[key] = 0
+    pipeline_stats['started_at'] = time.monotonic()
+
+def get_pipeline_status():
+    started_at = pipeline_stats['started_at']
+    elapsed = time.monotonic() - started_at if started_at else 0
+    rate = lambda value: round(value / elapsed, 2) if elapsed else 0.0
+    return {
+        'downloads': pipeline_stats['downloads'],
+        'download_bytes': pipeline_stats['download_bytes'],
+        'active_downloads': pipeline_stats['active_downloads'],
+        'parsed_files': pipeline_stats['parsed_files'],
+        'parsed_rows': pipeline_stats['parsed_rows'],
+        'downloads_per_sec': rate(pipeline_stats['downloads']),
+        'bytes_per_sec': rate(pipeline_stats['download_bytes']),
+        'parsed_rows_per_sec': rate(pipeline_stats['parsed_rows']),
+        'parse_queue_depth': sum(len(q) for q in list(parse_queues.values())),
+    }
 
 def get_worker_status():
-    return worker_status
+    return {**worker_status, 'errors': list(worker_status['errors']), 'pipeline': get_pipeline_status()}
+
+def report_error(message, stage=None):
+    if stage:
+        record_error(stage)
+    worker_status['errors'].append(message)
+
+register_gauge('leak_telegram_parse_queue_depth', "Downloaded files handed to ingest workers and not yet finished.",
+               lambda: {(str(channel_id),): len(q) for channel_id, q in list(parse_queues.items())}, ['channel'])
+register_gauge('leak_telegram_active_downloads', "Telegram downloads in flight.",
+               lambda: {(): pipeline_stats['active_downloads']})
 
 def get_last_msg_id_file(channel_id):
     return f'last_message_id_{channel_id}.txt'
@@ -42,70 +94,166 @@ def load_last_message_id(channel_id):
     except Exception:
         return 0
 
-def save_last_message_id(channel_id, msg_id):
-    fname = get_last_msg_id_file(channel_id)
-    with open(fname, 'w') as f:
-        f.write(str(msg_id))
-
-async def file_worker(queue):
-    while True:
-        item = await queue.get()
-        if item is None:
-            queue.task_done()
-            break
-        message, file_path, password = item
+async def handle_telegram_file(item, on_progress):
+    payload = item.payload
+    file_path = payload['path']
+    try:
+        file_hash = await asyncio.to_thread(file_sha256, file_path)
+        if await asyncio.to_thread(get_checkpoint_store().has_file, file_hash):
+            print(f"[Parsing] Skipping already ingested file: {payload['file_name']}")
+            result = {'rows_parsed': 0, 'rows_duplicate': 0, 'rows_inserted': 0, 'json_file': None}
+        else:
+            print(f"[Parsing] Started: {payload['file_name']}")
+            trace = start_trace(payload['file_name'], f"telegram:{payload['channel_id']}/{payload['message_id']}")
+            try:
+                result = await ingest_file(file_path, file_hash, password=payload['password'], trace=trace,
+                                           on_progress=on_progress)
+            except Exception:
+                trace.finish('failed')
+                raise
+            trace.finish('done')
+            del result['details']
+            print(f"[Parsing] Found {result['rows_parsed']} leaks, inserted {result['rows_inserted']} from: {payload['file_name']}")
+    except Exception:
+        if item.last_attempt and os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+    os.remove(file_path)
+    return {**result, 'file_hash': file_hash}
+
+register_handler(TELEGRAM_FILE_KIND, handle_telegram_file)
+
+class ChannelIngestor:
+    def __init__(self, client, channel):
+        self.client = client
+        self.channel = channel
+        self.channel_id = getattr(channel, 'id', str(channel))
+        self.title = getattr(channel, 'title', str(self.channel_id))
+        self.store = get_checkpoint_store()
+        last_msg_id = self.store.get_watermark(self.channel_id)
+        if last_msg_id is None:
+            last_msg_id = load_last_message_id(self.channel_id)
+        self.checkpoint = ChannelCheckpoint(self.store, self.channel_id, last_msg_id)
+        self.work_queue = get_work_queue()
+        # Work item id -> message id for files handed to ingest workers.
+        self.outstanding = {}
+        self.queue_slots = asyncio.Semaphore(PARSE_QUEUE_SIZE)
+        self.download_slots = asyncio.Semaphore(DOWNLOAD_CONCURRENCY)
+        self.downloads = set()
+        self.reconciler = None
+        self.submitted = 0
+
+    def start(self):
+        parse_queues[self.channel_id] = self.outstanding
+        self.reconciler = asyncio.create_task(self._reconcile_loop())
+
+    def _finish(self, message_id, record):
+        # Checkpoints are only advanced here, once a worker reports the file done.
+        self.queue_slots.release()
+        result = record['result'] or {}
+        if record['status'] == 'done':
+            self.checkpoint.complete(message_id, result['file_hash'], result['rows_inserted'])
+            pipeline_stats['parsed_files'] += 1
+            pipeline_stats['parsed_rows'] += result['rows_parsed']
+            worker_status['inserted_leaks'] += result['rows_inserted']
+        else:
+            report_error(f"Error processing {record['payload']['file_name']}: {record['error']}")
+            self.checkpoint.fail(message_id)
+
+    async def reconcile(self):
+        if not self.outstanding:
+            return
+        records = await asyncio.to_thread(self.work_queue.get_many, list(self.outstanding))
+        for item_id, record in records.items():
+            if record['status'] in ('done', 'failed'):
+                self._finish(self.outstanding.pop(item_id), record)
+
+    async def _reconcile_loop(self):
+        while True:
+            await asyncio.sleep(RECONCILE_INTERVAL)
+            try:
+                await self.reconcile()
+            except Exception as e:
+                print(f"[ERROR] Reconciling work items for {self.title} failed: {e}")
+
+    async def _download(self, message, file_name):
+        # The slot is held until the file is queued, so once PARSE_QUEUE_SIZE
+        # files are waiting on ingest workers new downloads stop starting.
+        pipeline_stats['active_downloads'] += 1
         try:
-            print(f"[Parsing] Started: {file_path}")
-            leaks = extract_and_parse(file_path, password=password)
-            print(f"[Parsing] Finished: {file_path}")
-            if leaks:
-                print(f"[Parsing] Found {len(leaks)} leaks in: {file_path}")
-                base_name = os.path.basename(file_path)
-                json_name = f"{os.path.splitext(base_name)[0]}_{message.id}.json"
-                json_path = os.path.join('uploads', json_name)
-                with open(json_path, 'w', encoding='utf-8') as jf:
-                    json.dump(leaks, jf, indent=2, ensure_ascii=False)
-
-                client_db = get_clickhouse_client()
-                now = datetime.utcnow()
-                clickhouse_data = []
-                for leak in leaks:
-                    clickhouse_data.append({
-                        'id': str(uuid.uuid4()),
-                        'software': leak.get('software', ''),
-                        'url': leak.get('url', ''),
-                        'username': leak.get('username', ''),
-                        'password': leak.get('password', ''),
-                        'date': now,
-                        **{k: v for k, v in leak.items() if k not in ['software', 'url', 'username', 'password']}
-                    })
-                table_columns = set(row[0] for row in client_db.execute(f"DESCRIBE TABLE Leaked_DB"))
-                all_columns = set()
-                for row in clickhouse_data:
-                    all_columns.update(row.keys())
-                for col in all_columns - table_columns:
-                    if col != 'id':
-                        client_db.execute(f"ALTER TABLE Leaked_DB ADD COLUMN IF NOT EXISTS {col} String")
-                all_columns = list(all_columns)
-                insert_data = []
-                for row in clickhouse_data:
-                    insert_data.append(tuple(row.get(col, '') if col != 'date' else row.get(col) for col in all_columns))
-                client_db.execute(
-                    f"INSERT INTO Leaked_DB ({', '.join(all_columns)}) VALUES",
-                    insert_data
-                )
-                worker_status['inserted_leaks'] += len(clickhouse_data)
-                print(f"[DB] Inserted {len(clickhouse_data)} leaks from {file_path}")
-            else:
-                print(f"[Parsing] No leaks found in: {file_path}")
+            password = None
+            if message.message:
+                pw_match = re.search(r'Password[:：]?\s*([@\w\d_\-]+)', message.message, re.IGNORECASE)
+                if pw_match:
+                    password = pw_match.group(1)
+            with stage_timer('download') as measured:
+                with tempfile.NamedTemporaryFile(delete=False) as tmp:
+                    file_path = await message.download_media(file=tmp.name)
+                measured['bytes'] = os.path.getsize(file_path)
+            print(f"[INFO] Downloaded: {file_path}")
+            pipeline_stats['downloads'] += 1
+            pipeline_stats['download_bytes'] += measured['bytes']
+            worker_status['last_file'] = file_path
+            await self.queue_slots.acquire()
+            try:
+                file_path = await asyncio.to_thread(spool_file, file_path, os.path.splitext(file_name)[1] or None)
+                item_id = await asyncio.to_thread(self.work_queue.enqueue, TELEGRAM_FILE_KIND, {
+                    'path': file_path,
+                    'password': password,
+                    'channel_id': self.channel_id,
+                    'message_id': message.id,
+                    'file_name': file_name,
+                })
+            except Exception:
+                self.queue_slots.release()
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+                raise
+            self.outstanding[item_id] = message.id
         except Exception as e:
-            print(f"[ERROR] {file_path}: {e}")
-            worker_status['errors'].append(f"Error processing {file_path}: {e}")
+            # Kept below the watermark so the next catch-up or restart retries it.
+            print(f"[ERROR] Download of {file_name} failed: {e}")
+            report_error(f"Error downloading {file_name}: {e}")
+            self.checkpoint.fail(message.id)
         finally:
-            os.remove(file_path)
-            queue.task_done()
+            pipeline_stats['active_downloads'] -= 1
+            self.download_slots.release()
 
-async def process_channel(target, client):
+    async def submit(self, message, scanned: bool = True):
+        # Live events are not part of a history scan and must not move it.
+        if scanned:
+            self.checkpoint.observe(message.id)
+        if not (message.media and isinstance(message.media, MessageMediaDocument)):
+            return
+        if message.id in self.checkpoint.pending or self.store.is_processed(self.channel_id, message.id):
+            return
+        file_name = message.file.name if hasattr(message, 'file') and hasattr(message.file, 'name') else 'unknown'
+        self.submitted += 1
+        # Marked pending before waiting for a slot so a catch-up and a live
+        # event can't both pick up the same message.
+        self.checkpoint.begin(message.id)
+        await self.download_slots.acquire()
+        print(f"[INFO] Downloading file {self.submitted} from {self.title}: {file_name}")
+        task = asyncio.create_task(self._download(message, file_name))
+        self.downloads.add(task)
+        task.add_done_callback(self.downloads.discard)
+
+    async def catch_up(self):
+        async for message in self.client.iter_messages(self.channel, min_id=self.checkpoint.watermark(), reverse=True):
+            await self.submit(message)
+        self.checkpoint.flush()
+
+    async def stop(self):
+        await asyncio.gather(*self.downloads)
+        print(f"[DEBUG] All {self.submitted} files queued for channel {self.title}.")
+        while self.outstanding:
+            await asyncio.sleep(RECONCILE_INTERVAL)
+        self.reconciler.cancel()
+        await asyncio.gather(self.reconciler, return_exceptions=True)
+        parse_queues.pop(self.channel_id, None)
+        self.checkpoint.flush()
+
+async def open_channel(target, client):
     try:
         print(f"[DEBUG] Getting channel entity for {target}...")
         channel = await client.get_entity(target)
@@ -114,65 +262,71 @@ async def process_channel(target, client):
         print(f"[ERROR] Failed to get channel {target}: {e}")
         import traceback
         traceback.print_exc()
+        return None
+    ingestor = ChannelIngestor(client, channel)
+    ingestor.start()
+    return ingestor
+
+async def process_channel(target, client):
+    ingestor = await open_channel(target, client)
+    if ingestor is None:
         return
+    await ingestor.catch_up()
+    await ingestor.stop()
+    print(f"[DEBUG] Finished processing channel {ingestor.title}.")
 
-    queue = asyncio.Queue()
-    workers = [asyncio.create_task(file_worker(queue)) for _ in range(WORKER_COUNT)]
-
-    last_msg_id = load_last_message_id(getattr(channel, 'id', str(target)))
-    total_files = 0
-    max_msg_id = last_msg_id
-    print(f"[DEBUG] Counting files in channel {getattr(channel, 'title', str(target))}...")
-    async for message in client.iter_messages(channel):
-        if message.id > last_msg_id and message.media and isinstance(message.media, MessageMediaDocument):
-            total_files += 1
-
-    print(f"[INFO] Found {total_files} new files in {getattr(channel, 'title', str(target))}.")
-    processed = 0
-    async for message in client.iter_messages(channel):
-        if message.id > last_msg_id and message.media and isinstance(message.media, MessageMediaDocument):
-            file_name = message.file.name if hasattr(message, 'file') and hasattr(message.file, 'name') else 'unknown'
-            processed += 1
-            print(f"[INFO] Downloading file {processed} of {total_files} from {getattr(channel, 'title', str(target))}: {file_name}")
-            password = None
-            if message.message:
-                pw_match = re.search(r'Password[:：]?\s*([@\w\d_\-]+)', message.message, re.IGNORECASE)
-                if pw_match:
-                    password = pw_match.group(1)
-            with tempfile.NamedTemporaryFile(delete=False) as tmp:
-                file_path = await message.download_media(file=tmp.name)
-                print(f"[INFO] Downloaded: {file_path}")
-                worker_status['last_file'] = file_path
-                await queue.put((message, file_path, password))
-            if message.id > max_msg_id:
-                max_msg_id = message.id
-
-    print(f"[DEBUG] All files queued for channel {getattr(channel, 'title', str(target))}.")
-    for _ in range(WORKER_COUNT):
-        await queue.put(None)
-    await queue.join()
-    for w in workers:
-        await w
-    save_last_message_id(getattr(channel, 'id', str(target)), max_msg_id)
-    print(f"[DEBUG] Finished processing channel {getattr(channel, 'title', str(target))}.")
-
-async def run_telegram_worker():
+async def run_live(client, ingestors):
+    by_chat = {get_peer_id(ingestor.channel): ingestor for ingestor in ingestors}
+
+    async def on_new_message(event):
+        ingestor = by_chat.get(event.chat_id)
+        if ingestor is not None:
+            await ingestor.submit(event.message, scanned=False)
+
+    client.add_event_handler(on_new_message, events.NewMessage(chats=list(by_chat)))
+    print(f"[Telegram Worker] Listening for new messages in {len(by_chat)} channels.")
+    try:
+        # The handler is registered first so nothing posted during the initial
+        # catch-up is missed. The periodic catch-up picks up anything missed
+        # while disconnected and retries failed downloads.
+        await asyncio.gather(*(ingestor.catch_up() for ingestor in ingestors))
+        while True:
+            await asyncio.sleep(POLL_INTERVAL)
+            worker_status['last_checked'] = str(datetime.utcnow())
+            for ingestor in ingestors:
+                try:
+                    await ingestor.catch_up()
+                except Exception as e:
+                    print(f"[ERROR] Catch-up for {ingestor.title} failed: {e}")
+                    report_error(f"Error catching up {ingestor.title}: {e}", 'catch_up')
+    finally:
+        client.remove_event_handler(on_new_message)
+
+async def run_telegram_worker(client=None, live=None):
     print("[Telegram Worker] Worker started!")
     worker_status['running'] = True
     worker_status['last_checked'] = str(datetime.utcnow())
     worker_status['inserted_leaks'] = 0
-    worker_status['errors'] = []
+    worker_status['errors'].clear()
+    reset_pipeline_stats()
+    live = LIVE_MODE if live is None else live
 
-    client = TelegramClient(session_name, api_id, api_hash)
+    if client is None:
+        client = TelegramClient(session_name, api_id, api_hash)
     print("[DEBUG] Awaiting client.start()...")
     await client.start()
     print("[DEBUG] Logged in to Telegram.")
     print(f"[DEBUG] Target channels: {target_channels}")
 
-    channel_tasks = [asyncio.create_task(process_channel(target, client)) for target in target_channels]
-    await asyncio.gather(*channel_tasks)
-
-    await client.disconnect()
-    worker_status['running'] = False
-    worker_status['last_checked'] = str(datetime.utcnow())
+    try:
+        if live:
+            ingestors = [i for i in await asyncio.gather(*(open_channel(t, client) for t in target_channels)) if i]
+            await run_live(client, ingestors)
+        else:
+            channel_tasks = [asyncio.create_task(process_channel(target, client)) for target in target_channels]
+            await asyncio.gather(*channel_tasks)
+    finally:
+        await client.disconnect()
+        worker_status['running'] = False
+        worker_status['last_checked'] = str(datetime.utcnow())
     print("All downloads and insertions complete.")
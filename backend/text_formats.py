@@ -0,0 +1,354 @@
+import io
+import os
+import re
+import json
+from typing import Callable, Iterator, List
+
+TEXT_CHUNK_SIZE = int(os.getenv('PARSE_CHUNK_SIZE', 1024 * 1024))
+MAX_CARRY_SIZE = int(os.getenv('PARSE_MAX_CARRY', 64 * 1024))
+SNIFF_SIZE = int(os.getenv('PARSE_SNIFF_SIZE', 8192))
+COMBO_MAX_LINE = int(os.getenv('PARSE_COMBO_MAX_LINE', 2048))
+JSON_MAX_VALUE_SIZE = int(os.getenv('PARSE_JSON_MAX_VALUE', 1024 * 1024))
+
+# Every field is confined to a single line ([^\r\n]+), so a malformed block
+# fails fast at the next newline instead of backtracking across the file.
+# Group names may carry a "<prefix>__" so several formats can share one regex.
+SOFT_BLOCK_SOURCE = (
+    r"SOFT:[ \t]*(?P<{p}software>[^\r\n]+)\r?\n"
+    r"(?:URL|HOST):[ \t]*(?P<{p}url>[^\r\n]+)\r?\n"
+    r"USER:[ \t]*(?P<{p}username>[^\r\n]+)\r?\n"
+    r"PASS:[ \t]*(?P<{p}password>[^\r\n]+)"
+)
+CUSTOM_BLOCK_SOURCE = (
+    r"URL:[ \t]*(?P<{p}url>[^\r\n]+)\r?\n"
+    r"Username:[ \t]*(?P<{p}username>[^\r\n]+)\r?\n"
+    r"Password:[ \t]*(?P<{p}password>[^\r\n]+)\r?\n"
+    r"Application:[ \t]*(?P<{p}software>[^\r\n]+)\r?\n=+"
+)
+
+LEAK_PATTERN = re.compile(SOFT_BLOCK_SOURCE.format(p=''), re.IGNORECASE)
+CUSTOM_BLOCK_PATTERN = re.compile(CUSTOM_BLOCK_SOURCE.format(p=''), re.IGNORECASE)
+MIXED_BLOCK_PATTERN = re.compile(
+    f"(?:{SOFT_BLOCK_SOURCE.format(p='soft__')})|(?:{CUSTOM_BLOCK_SOURCE.format(p='custom__')})",
+    re.IGNORECASE
+)
+COMBO_LINE_PATTERN = re.compile(
+    r"(?P<url>(?:[a-z][a-z0-9+.\-]*://)?[^\s:;|/]+(?::\d{1,5})?(?:/\S*?)?)[:;|]"
+    r"(?P<username>[^\s:;|]+)[:;|](?P<password>\S.*?)\s*",
+    re.IGNORECASE
+)
+COMBO_EMAIL_PATTERN = re.compile(r"(?P<username>[^\s:;|@]+@[^\s:;|]+)[:;|](?P<password>\S.*?)\s*")
+JSON_RECORD_START = re.compile(r'(?:\[\s*)?\{\s*"(?:[^"\\\r\n]|\\.)*"\s*:')
+JSON_WHITESPACE = re.compile(r'[\ufeff \t\r\n]*')
+JSON_NEXT_RECORD = re.compile(r',\s*(?=\{)')
+# Errors this close to the end of the buffer may just be a cut-off token.
+JSON_TRUNCATED_WINDOW = 16
+JSON_DECODER = json.JSONDecoder()
+
+JSON_FIELD_ALIASES = {
+    'url': ['url', 'origin_url', 'hostname', 'uri', 'website', 'site'],
+    'username': ['username', 'username_value', 'login', 'email', 'user'],
+    'password': ['password', 'password_value', 'pass'],
+}
+
+
+def _record_from_match(match) -> dict:
+    record = {}
+    for key, value in match.groupdict().items():
+        if value is not None:
+            record[key.split('__')[-1]] = value.strip()
+    return record
+
+
+def _scan_buffer(pattern, buffer: str, final: bool):
+    # A match touching the end of a non-final buffer may still be incomplete
+    # (e.g. a password cut mid-line), so it is carried into the next chunk.
+    leaks = []
+    consumed = 0
+    for match in pattern.finditer(buffer):
+        if not final and match.end() >= len(buffer):
+            break
+        leaks.append(_record_from_match(match))
+        consumed = match.end()
+    carry = buffer[consumed:]
+    if len(carry) > MAX_CARRY_SIZE:
+        carry = carry[-MAX_CARRY_SIZE:]
+    return leaks, carry
+
+
+def iter_pattern_stream(stream, pattern, chunk_size: int = TEXT_CHUNK_SIZE) -> Iterator[dict]:
+    carry = ''
+    while True:
+        chunk = stream.read(chunk_size)
+        final = not chunk
+        leaks, carry = _scan_buffer(pattern, carry + chunk, final)
+        yield from leaks
+        if final:
+            break
+
+
+def iter_text_lines(stream, chunk_size: int = TEXT_CHUNK_SIZE) -> Iterator[str]:
+    carry = ''
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        lines = (carry + chunk).split('\n')
+        carry = lines.pop()
+        yield from lines
+    if carry:
+        yield carry
+
+
+def parse_combo_line(line: str):
+    line = line.strip()
+    if not line or len(line) > COMBO_MAX_LINE:
+        return None
+    head = re.split(r"[:;|]", line, maxsplit=1)[0]
+    if '@' in head and '://' not in line:
+        match = COMBO_EMAIL_PATTERN.fullmatch(line)
+        if match:
+            return {'url': '', **_record_from_match(match)}
+        return None
+    match = COMBO_LINE_PATTERN.fullmatch(line)
+    if match:
+        return _record_from_match(match)
+    return None
+
+
+def iter_combo_stream(stream, chunk_size: int = TEXT_CHUNK_SIZE) -> Iterator[dict]:
+    for line in iter_text_lines(stream, chunk_size):
+        leak = parse_combo_line(line)
+        if leak:
+            yield leak
+
+
+def normalize_json_record(record: dict) -> dict:
+    if isinstance(record.get('login'), dict):
+        # Password-manager exports (e.g. Bitwarden) nest credentials under "login".
+        login = record['login']
+        uris = login.get('uris') or [{}]
+        return {
+            'software': record.get('name', ''),
+            'url': (uris[0] or {}).get('uri', ''),
+            'username': login.get('username') or '',
+            'password': login.get('password') or '',
+        }
+    leak = dict(record)
+    for field, aliases in JSON_FIELD_ALIASES.items():
+        if field not in leak:
+            for alias in aliases:
+                if alias in record:
+                    leak[field] = record[alias]
+                    break
+    return leak
+
+
+class _JsonReader:
+    # Decodes one value at a time from a chunked stream, so only the current
+    # array element has to fit in memory, not the whole export.
+    def __init__(self, stream, chunk_size: int):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _more(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            self.pos = JSON_WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._more():
+                return ''
+
+    def take(self) -> str:
+        char = self.peek()
+        self.pos += len(char)
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = JSON_DECODER.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as e:
+                # Only a value cut off by the end of the buffer is worth reading
+                # more for; anything else is malformed and left to the caller.
+                truncated = len(self.buffer) - e.pos <= JSON_TRUNCATED_WINDOW or e.msg.startswith('Unterminated string')
+                if truncated and len(self.buffer) - self.pos < JSON_MAX_VALUE_SIZE and self._more():
+                    continue
+                raise
+            # A number touching the end of the buffer may continue in the next chunk.
+            if end == len(self.buffer) and self._more():
+                continue
+            self.pos = end
+            return value
+
+    def resync(self) -> bool:
+        # Skips a malformed element by moving to the next object in the array.
+        while True:
+            match = JSON_NEXT_RECORD.search(self.buffer, self.pos + 1)
+            if match:
+                self.pos = match.end()
+                return True
+            # Keep a short tail in case the separator straddles two chunks.
+            self.pos = max(self.pos, len(self.buffer) - JSON_TRUNCATED_WINDOW)
+            if not self._more():
+                return False
+
+    def array(self) -> Iterator:
+        if self.peek() == ']':
+            self.take()
+            return
+        while True:
+            try:
+                value = self.value()
+            except json.JSONDecodeError:
+                if not self.resync():
+                    return
+                continue
+            yield value
+            if self.take() != ',':
+                return
+
+
+def _iter_json_leaks(items: Iterator) -> Iterator[dict]:
+    for item in items:
+        leak = normalize_json_record(item) if isinstance(item, dict) else {}
+        if 'username' in leak or 'password' in leak:
+            yield leak
+
+
+def iter_json_stream(stream, chunk_size: int = TEXT_CHUNK_SIZE) -> Iterator[dict]:
+    reader = _JsonReader(stream, chunk_size)
+    try:
+        start = reader.take()
+        if start == '[':
+            yield from _iter_json_leaks(reader.array())
+        elif start == '{':
+            # Exports wrap their records in a list under some key; the first
+            # list holding credentials is taken (Bitwarden puts "folders"
+            # before "items"), every other member is skipped.
+            while reader.peek() not in ('}', ''):
+                reader.value()
+                if reader.take() != ':':
+                    return
+                if reader.peek() == '[':
+                    reader.take()
+                    found = False
+                    for leak in _iter_json_leaks(reader.array()):
+                        found = True
+                        yield leak
+                    if found:
+                        return
+                else:
+                    reader.value()
+                if reader.take() != ',':
+                    return
+    except json.JSONDecodeError:
+        return
+
+
+def parse_leaks_from_json(data: str) -> List[dict]:
+    return list(iter_json_stream(io.StringIO(data)))
+
+
+def _looks_like_json(sample: str) -> bool:
+    # "[ RedLine log ]" banners open plenty of text logs, so a leading bracket
+    # alone is not enough: the sample has to parse, or open with a record key.
+    text = sample.lstrip('\ufeff \t\r\n')
+    if text[:1] not in ('[', '{'):
+        return False
+    if JSON_RECORD_START.match(text):
+        return True
+    try:
+        json.loads(text)
+    except ValueError:
+        return False
+    return True
+
+
+def _looks_like_combolist(sample: str) -> bool:
+    lines = sample.splitlines()
+    if len(sample) >= SNIFF_SIZE:
+        # The sample was cut off, so its last line may be partial.
+        lines = lines[:-1]
+    lines = [line for line in lines if line.strip()][:50]
+    if not lines:
+        return False
+    return sum(1 for line in lines if parse_combo_line(line)) >= 0.6 * len(lines)
+
+
+class TextFormat:
+    def __init__(self, name: str, sniff: Callable[[str], bool], scan: Callable):
+        self.name = name
+        self.sniff = sniff
+        self.scan = scan
+
+
+TEXT_FORMATS = []
+
+
+def register_text_format(name: str, sniff: Callable[[str], bool], scan: Callable, before: str = None):
+    fmt = TextFormat(name, sniff, scan)
+    names = [f.name for f in TEXT_FORMATS]
+    TEXT_FORMATS.insert(names.index(before) if before in names else len(TEXT_FORMATS), fmt)
+    return fmt
+
+
+# Block files get one pass covering both layouts, so blocks of a layout that
+# only shows up past the sample are still found. It is also the fallback
+# when the sample matches nothing, which is what every file used to get.
+FALLBACK_FORMAT = TextFormat(
+    'mixed_blocks', lambda sample: True, lambda stream, chunk_size: iter_pattern_stream(stream, MIXED_BLOCK_PATTERN, chunk_size)
+)
+
+register_text_format('json', _looks_like_json, iter_json_stream)
+register_text_format(
+    'mixed_blocks',
+    lambda sample: bool(LEAK_PATTERN.search(sample)) or bool(CUSTOM_BLOCK_PATTERN.search(sample)),
+    FALLBACK_FORMAT.scan
+)
+register_text_format('combolist', _looks_like_combolist, iter_combo_stream)
+
+
+def detect_text_format(sample: str) -> TextFormat:
+    for fmt in TEXT_FORMATS:
+        if fmt.sniff(sample):
+            return fmt
+    return FALLBACK_FORMAT
+
+
+class _PrefixedStream:
+    def __init__(self, prefix: str, stream):
+        self.prefix = prefix
+        self.stream = stream
+
+    def read(self, size: int = -1) -> str:
+        if not self.prefix:
+            return self.stream.read(size)
+        if size is None or size < 0:
+            data, self.prefix = self.prefix + self.stream.read(), ''
+            return data
+        data, self.prefix = self.prefix[:size], self.prefix[size:]
+        if len(data) < size:
+            data += self.stream.read(size - len(data))
+        return data
+
+
+def iter_leaks_from_text_stream(stream, chunk_size: int = TEXT_CHUNK_SIZE) -> Iterator[dict]:
+    sample = stream.read(SNIFF_SIZE)
+    fmt = detect_text_format(sample)
+    yield from fmt.scan(_PrefixedStream(sample, stream), chunk_size)
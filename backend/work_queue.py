@@ -0,0 +1,304 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional
+
+WORK_QUEUE_BACKEND = os.getenv('WORK_QUEUE_BACKEND', 'sqlite')
+WORK_QUEUE_URL = os.getenv('WORK_QUEUE_URL', 'ingest_queue.sqlite3')
+WORK_LEASE_SECONDS = float(os.getenv('WORK_LEASE_SECONDS', 60))
+WORK_MAX_ATTEMPTS = int(os.getenv('WORK_MAX_ATTEMPTS', 3))
+WORK_RETRY_BACKOFF = float(os.getenv('WORK_RETRY_BACKOFF', 5))
+WORK_RETENTION_SECONDS = float(os.getenv('WORK_RETENTION_SECONDS', 7 * 24 * 3600))
+# Files handed to workers must live where every worker can read them.
+SPOOL_DIR = os.getenv('WORK_SPOOL_DIR', 'spool')
+
+
+class WorkItem:
+    def __init__(self, id: str, kind: str, payload: dict, attempts: int, max_attempts: int, lease_owner: str = None):
+        self.id = id
+        self.kind = kind
+        self.payload = payload
+        self.attempts = attempts
+        self.max_attempts = max_attempts
+        self.lease_owner = lease_owner
+
+    @property
+    def last_attempt(self) -> bool:
+        return self.attempts >= self.max_attempts
+
+
+class WorkQueue(ABC):
+    # Broker interface. Items move queued -> running -> done | failed. A running
+    # item whose lease expires is handed to the next claimer, so a crashed
+    # worker only delays its item by one lease period.
+    @abstractmethod
+    def enqueue(self, kind: str, payload: dict, max_attempts: int = WORK_MAX_ATTEMPTS) -> str:
+        ...
+
+    @abstractmethod
+    def claim(self, worker_id: str, kinds: List[str] = None, lease_seconds: float = WORK_LEASE_SECONDS) -> Optional[WorkItem]:
+        ...
+
+    @abstractmethod
+    def heartbeat(self, item: WorkItem, progress: dict = None, lease_seconds: float = WORK_LEASE_SECONDS) -> bool:
+        ...
+
+    @abstractmethod
+    def complete(self, item: WorkItem, result: dict = None):
+        ...
+
+    @abstractmethod
+    def fail(self, item: WorkItem, error: str, retry: bool = True):
+        ...
+
+    @abstractmethod
+    def get(self, item_id: str) -> Optional[dict]:
+        ...
+
+    def get_many(self, item_ids: List[str]) -> Dict[str, dict]:
+        return {item_id: record for item_id in item_ids if (record := self.get(item_id)) is not None}
+
+    @abstractmethod
+    def pending(self, kinds: List[str] = None) -> int:
+        ...
+
+    def purge(self, older_than: float = WORK_RETENTION_SECONDS):
+        pass
+
+    @abstractmethod
+    def data_version(self) -> int:
+        ...
+
+    @abstractmethod
+    def bump_data_version(self):
+        ...
+
+    @abstractmethod
+    def stats(self) -> dict:
+        ...
+
+    def close(self):
+        pass
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS work_items (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    progress TEXT,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_work_items_claim ON work_items (status, available_at);
+CREATE TABLE IF NOT EXISTS queue_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+RECORD_COLUMNS = [
+    'id', 'kind', 'payload', 'status', 'attempts', 'max_attempts', 'lease_owner', 'progress', 'result', 'error',
+    'created_at', 'started_at', 'finished_at',
+]
+
+
+class SQLiteWorkQueue(WorkQueue):
+    # Good for any number of worker processes on one host or on a shared
+    # volume with working file locks; a network broker can implement the same
+    # interface for multi-host deployments.
+    def __init__(self, path: str = WORK_QUEUE_URL):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def _transaction(self, fn):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+                self._conn.execute("COMMIT")
+                return result
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def enqueue(self, kind: str, payload: dict, max_attempts: int = WORK_MAX_ATTEMPTS) -> str:
+        item_id = str(uuid.uuid4())
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO work_items (id, kind, payload, status, max_attempts, available_at, created_at) "
+                "VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                (item_id, kind, json.dumps(payload), max_attempts, now, now)
+            )
+        return item_id
+
+    def claim(self, worker_id: str, kinds: List[str] = None, lease_seconds: float = WORK_LEASE_SECONDS) -> Optional[WorkItem]:
+        def claim_next(conn):
+            now = time.time()
+            # Items whose lease ran out on their final attempt are given up on.
+            conn.execute(
+                "UPDATE work_items SET status = 'failed', error = 'Lease expired on final attempt', finished_at = ? "
+                "WHERE status = 'running' AND lease_expires < ? AND attempts >= max_attempts",
+                (now, now)
+            )
+            kind_filter = f" AND kind IN ({', '.join('?' * len(kinds))})" if kinds else ''
+            row = conn.execute(
+                "SELECT id, kind, payload, attempts, max_attempts FROM work_items "
+                "WHERE ((status = 'queued' AND available_at <= ?) OR (status = 'running' AND lease_expires < ?))"
+                f"{kind_filter} ORDER BY available_at LIMIT 1",
+                (now, now, *(kinds or []))
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE work_items SET status = 'running', attempts = attempts + 1, lease_owner = ?, lease_expires = ?, "
+                "started_at = COALESCE(started_at, ?) WHERE id = ?",
+                (worker_id, now + lease_seconds, now, row[0])
+            )
+            return WorkItem(row[0], row[1], json.loads(row[2]), row[3] + 1, row[4], worker_id)
+        return self._transaction(claim_next)
+
+    def heartbeat(self, item: WorkItem, progress: dict = None, lease_seconds: float = WORK_LEASE_SECONDS) -> bool:
+        # Returns False once the lease has been lost to another worker.
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE work_items SET lease_expires = ?, progress = COALESCE(?, progress) "
+                "WHERE id = ? AND status = 'running' AND lease_owner = ?",
+                (time.time() + lease_seconds, json.dumps(progress) if progress is not None else None,
+                 item.id, item.lease_owner)
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, item: WorkItem, result: dict = None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE work_items SET status = 'done', result = ?, error = NULL, lease_expires = NULL, finished_at = ? "
+                "WHERE id = ? AND lease_owner = ?",
+                (json.dumps(result, default=str), time.time(), item.id, item.lease_owner)
+            )
+
+    def fail(self, item: WorkItem, error: str, retry: bool = True):
+        now = time.time()
+        if retry and not item.last_attempt:
+            with self._lock:
+                self._conn.execute(
+                    "UPDATE work_items SET status = 'queued', error = ?, lease_owner = NULL, lease_expires = NULL, "
+                    "available_at = ? WHERE id = ? AND lease_owner = ?",
+                    (error, now + WORK_RETRY_BACKOFF * 2 ** (item.attempts - 1), item.id, item.lease_owner)
+                )
+            return
+        with self._lock:
+            self._conn.execute(
+                "UPDATE work_items SET status = 'failed', error = ?, lease_expires = NULL, finished_at = ? "
+                "WHERE id = ? AND lease_owner = ?",
+                (error, now, item.id, item.lease_owner)
+            )
+
+    def _record(self, row) -> dict:
+        record = dict(zip(RECORD_COLUMNS, row))
+        for key in ('payload', 'progress', 'result'):
+            record[key] = json.loads(record[key]) if record[key] else None
+        return record
+
+    def get(self, item_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(RECORD_COLUMNS)} FROM work_items WHERE id = ?", (item_id,)
+            ).fetchone()
+        return self._record(row) if row else None
+
+    def get_many(self, item_ids: List[str]) -> Dict[str, dict]:
+        if not item_ids:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(RECORD_COLUMNS)} FROM work_items WHERE id IN ({', '.join('?' * len(item_ids))})",
+                list(item_ids)
+            ).fetchall()
+        return {row[0]: self._record(row) for row in rows}
+
+    def pending(self, kinds: List[str] = None) -> int:
+        kind_filter = f" AND kind IN ({', '.join('?' * len(kinds))})" if kinds else ''
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT COUNT(*) FROM work_items WHERE status IN ('queued', 'running'){kind_filter}", list(kinds or [])
+            ).fetchone()
+        return row[0]
+
+    def data_version(self) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM queue_meta WHERE key = 'data_version'").fetchone()
+        return row[0] if row else 0
+
+    def bump_data_version(self):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO queue_meta (key, value) VALUES ('data_version', 1) "
+                "ON CONFLICT(key) DO UPDATE SET value = value + 1"
+            )
+
+    def purge(self, older_than: float = WORK_RETENTION_SECONDS):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM work_items WHERE status IN ('done', 'failed') AND finished_at < ?",
+                (time.time() - older_than,)
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT kind, status, COUNT(*) FROM work_items GROUP BY kind, status").fetchall()
+        return {(kind, status): count for kind, status, count in rows}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+QUEUE_BACKENDS: Dict[str, Callable[[str], WorkQueue]] = {'sqlite': SQLiteWorkQueue}
+
+
+def register_queue_backend(name: str, factory: Callable[[str], WorkQueue]):
+    QUEUE_BACKENDS[name] = factory
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_work_queue() -> WorkQueue:
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = QUEUE_BACKENDS[WORK_QUEUE_BACKEND](WORK_QUEUE_URL)
+        return _queue
+
+
+def spool_path(suffix: str = '') -> str:
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    return os.path.abspath(os.path.join(SPOOL_DIR, f"{uuid.uuid4().hex}{suffix}"))
+
+
+def spool_file(file_path: str, suffix: str = None) -> str:
+    # Moves a local file (e.g. a Telegram download in /tmp) into the spool.
+    target = spool_path(os.path.splitext(file_path)[1] if suffix is None else suffix)
+    shutil.move(file_path, target)
+    return target
@@ -8,11 +8,25 @@ import StatusPanel from "./components/StatusPanel";
 import DangerBanner from "./components/DangerBanner";
 import axios from "axios";
 
+const JOB_POLL_INTERVAL_MS = 1000;
+
+async function waitForJob(jobId) {
+  for (;;) {
+    const res = await axios.get(`/jobs/${jobId}`);
+    if (res.data.status === "done" || res.data.status === "failed") {
+      return res.data;
+    }
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+  }
+}
+
 function App() {
   const [results, setResults] = useState([]);
   const [uploading, setUploading] = useState(false);
   const [progress, setProgress] = useState(0);
   const [uploadResult, setUploadResult] = useState(null);
+  const [lastQuery, setLastQuery] = useState("");
+  const [nextCursor, setNextCursor] = useState(null);
 
   const handleFileSelect = async (file) => {
     setUploading(true);
@@ -22,6 +36,7 @@ function App() {
     formData.append("file", file);
     try {
       const res = await axios.post("/upload", formData, {
+        params: { details: true },
         headers: { "Content-Type": "multipart/form-data" },
         onUploadProgress: (e) => {
           if (e.total) {
@@ -29,10 +44,15 @@ function App() {
           }
         },
       });
-      setResults(res.data.details || []);
+      const job = await waitForJob(res.data.job_id);
+      if (job.status === "failed") {
+        throw new Error(job.error || "Ingestion failed");
+      }
+      setResults(job.result.details || []);
+      setNextCursor(null);
       setUploadResult({
-        inserted_rows: res.data.inserted_rows,
-        json_file: res.data.json_file,
+        inserted_rows: job.result.inserted_rows,
+        json_file: job.result.json_file,
       });
     } catch (e) {
       alert("Upload failed: " + (e.response?.data?.detail || e.message));
@@ -41,10 +61,13 @@ function App() {
     setProgress(0);
   };
 
-  const handleSearch = async (query) => {
+  const handleSearch = async (query, cursor = null) => {
     try {
-      const res = await axios.post("/search", { query });
-      setResults(res.data.results || []);
+      const res = await axios.post("/search", { query, cursor });
+      const page = res.data.results || [];
+      setResults((prev) => (cursor ? [...prev, ...page] : page));
+      setLastQuery(query);
+      setNextCursor(res.data.next_cursor || null);
     } catch (e) {
       alert("Search failed: " + (e.response?.data?.detail || e.message));
     }
@@ -64,6 +87,9 @@ function App() {
       <SearchBar onSearch={handleSearch} />
       <StatusPanel />
       <ResultsTable results={results} />
+      {nextCursor && (
+        <button onClick={() => handleSearch(lastQuery, nextCursor)}>Load more</button>
+      )}
     </>
   );
 }
@@ -0,0 +1,28 @@
+import os
+import gzip
+import json
+from backend.artifacts import ArtifactWriter, enforce_retention
+
+
+def test_artifact_round_trip(tmp_path):
+    writer = ArtifactWriter('a' * 64, codec='gzip', directory=str(tmp_path))
+    writer.write_many([{'username': 'bob'}, {'username': 'eve'}])
+    url = writer.close()
+    assert url.endswith('a' * 32 + '.ndjson.gz')
+    with gzip.open(tmp_path / ('a' * 32 + '.ndjson.gz'), 'rt') as f:
+        assert [json.loads(line)['username'] for line in f] == ['bob', 'eve']
+
+
+def test_upload_without_new_rows_writes_nothing(tmp_path):
+    writer = ArtifactWriter('b' * 64, codec='gzip', directory=str(tmp_path))
+    writer.write_many([])
+    assert writer.close() is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_retention_only_touches_artifacts(tmp_path):
+    (tmp_path / 'Passwords.json').write_text('[]')
+    for i in range(3):
+        (tmp_path / f"{i:032d}.ndjson.gz").write_bytes(b'x')
+    enforce_retention(str(tmp_path), max_bytes=1 << 20, max_files=1)
+    assert sorted(os.listdir(tmp_path)) == ['00000000000000000000000000000002.ndjson.gz', 'Passwords.json']
@@ -0,0 +1,80 @@
+import asyncio
+from backend import dedup
+from backend.ingest import regroup_batches
+from backend.normalize import normalize_leak
+
+
+class FakeClient:
+    def __init__(self, fingerprints=(), legacy=()):
+        self.fingerprints = set(fingerprints)
+        self.legacy = [tuple(row) for row in legacy]
+        self.queries = []
+
+    def execute(self, sql, params=None, external_tables=None):
+        self.queries.append(sql)
+        if external_tables:
+            data = external_tables[0]['data']
+            if external_tables[0]['name'] == '_dedup_batch':
+                return [(r['fingerprint'],) for r in data if r['fingerprint'] in self.fingerprints]
+            keys = {(r['username'], r['password']) for r in data}
+            return [row for row in self.legacy if (row[1].strip().lower(), row[2]) in keys]
+        if 'fingerprint = 0' in sql:
+            return [(1,)] if self.legacy else []
+        return []
+
+
+def leak(username, password='hunter2', url='https://example.com/login'):
+    return {'software': 'Chrome', 'url': url, 'username': username, 'password': password}
+
+
+def usernames(leaks):
+    return [leak['username'] for leak in leaks]
+
+
+def test_fingerprint_matches_are_dropped():
+    client = FakeClient(fingerprints=[normalize_leak(leak('alice'))['fingerprint']])
+    kept = dedup.LeakDeduplicator(client).filter([leak('alice'), leak('bob')])
+    assert usernames(kept) == ['bob']
+
+
+def test_legacy_rows_are_matched_on_credentials():
+    client = FakeClient(legacy=[('https://example.com/login', ' Alice ', 'hunter2')])
+    deduplicator = dedup.LeakDeduplicator(client)
+    assert usernames(deduplicator.filter([leak('alice'), leak('bob')])) == ['bob']
+    assert deduplicator.duplicates == 1
+
+
+def test_legacy_rows_are_compared_like_fingerprints():
+    # Same host and case-insensitive username count as the same credential,
+    # exactly as they do between fingerprinted rows; another host does not.
+    client = FakeClient(legacy=[('https://example.com/other/path', 'ALICE', 'hunter2'),
+                                ('https://elsewhere.com/login', 'bob', 'hunter2')])
+    kept = dedup.LeakDeduplicator(client).filter([leak('alice'), leak('Bob')])
+    assert usernames(kept) == ['bob']
+
+
+def test_legacy_lookup_skipped_without_legacy_rows():
+    client = FakeClient()
+    deduplicator = dedup.LeakDeduplicator(client, batch_size=1)
+    assert usernames(deduplicator.filter([leak('alice'), leak('bob')])) == ['alice', 'bob']
+    # The presence check runs once per deduplicator, and no credential lookup follows.
+    assert sum('fingerprint = 0' in sql for sql in client.queries) == 1
+
+
+def test_legacy_fallback_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(dedup, 'DEDUP_LEGACY_FALLBACK', False)
+    client = FakeClient(legacy=[('https://example.com/login', 'alice', 'hunter2')])
+    assert usernames(dedup.LeakDeduplicator(client).filter([leak('alice')])) == ['alice']
+
+
+def test_parse_batches_are_regrouped_to_the_dedup_batch_size():
+    async def parse_batches():
+        for start in range(0, 2500, 1000):
+            yield list(range(start, min(start + 1000, 2500)))
+
+    async def collect():
+        return [batch async for batch in regroup_batches(parse_batches(), 1200)]
+
+    batches = asyncio.run(collect())
+    assert [len(batch) for batch in batches] == [1200, 1200, 100]
+    assert sum(batches, []) == list(range(2500))
@@ -0,0 +1,43 @@
+from types import SimpleNamespace
+from backend import search
+
+
+def test_short_misspelled_query_keeps_fuzzy_candidates():
+    sql, params = search.build_search_query('jonh', mode='fuzzy')
+    pieces = [params[key].strip('%') for key in params if key.startswith('piece')]
+    assert pieces and any(piece in 'john' for piece in pieces)
+    # Candidates are confirmed by edit distance ('jonh' -> 'john' is one transposition).
+    assert 'damerauLevenshteinDistance(lower(username), %(q)s) <= %(max_edits)s' in sql
+    assert params['max_edits'] == 1 and params['max_length'] == 5
+    assert 'score >= %(threshold)s' not in sql
+
+
+def test_long_fuzzy_query_uses_index_sized_pieces():
+    sql, params = search.build_search_query('johnsmith1987', mode='fuzzy')
+    pieces = [params[key].strip('%') for key in params if key.startswith('piece')]
+    assert all(len(piece) >= search.SEARCH_FUZZY_MIN_PIECE for piece in pieces)
+    assert 'score >= %(threshold)s' in sql
+    assert 'damerauLevenshteinDistance' not in sql
+
+
+def test_exact_mode_has_no_fuzzy_candidates():
+    sql, params = search.build_search_query('jonh', mode='exact')
+    assert not any(key.startswith('piece') for key in params)
+    assert 'LIKE' not in sql
+
+
+class FakeClient:
+    def __init__(self, rows_read=0, elapsed=0.0):
+        self.last_query = None
+        self.rows_read = rows_read
+        self.elapsed = elapsed
+
+    def execute(self, sql, params=None, settings=None):
+        self.last_query = SimpleNamespace(progress=SimpleNamespace(rows=self.rows_read), elapsed=self.elapsed)
+        return []
+
+
+def test_search_page_flags_results_cut_short_by_limits():
+    assert search.search_page(FakeClient(rows_read=10), 'bob') == ([], False)
+    assert search.search_page(FakeClient(rows_read=search.SEARCH_MAX_ROWS_TO_READ), 'bob') == ([], True)
+    assert search.search_page(FakeClient(elapsed=search.SEARCH_MAX_EXECUTION_TIME), 'bob') == ([], True)
@@ -0,0 +1,126 @@
+import asyncio
+import pytest
+from telethon.tl.types import MessageMediaDocument
+import backend.telegram_worker as telegram_worker
+from backend.checkpoint_store import ChannelCheckpoint, CheckpointStore
+from backend.work_queue import SQLiteWorkQueue
+
+CHANNEL_ID = 42
+
+
+class FakeFile:
+    name = 'log.txt'
+
+
+class FakeMessage:
+    def __init__(self, message_id, media=True):
+        self.id = message_id
+        self.message = ''
+        self.media = MessageMediaDocument() if media else None
+        self.file = FakeFile()
+
+
+class FakeChannel:
+    id = CHANNEL_ID
+    title = 'channel'
+
+
+class FakeClient:
+    def __init__(self, messages):
+        self.messages = messages
+        self.min_ids = []
+
+    async def iter_messages(self, channel, min_id=0, reverse=False):
+        self.min_ids.append(min_id)
+        for message in sorted(self.messages, key=lambda m: m.id):
+            if message.id > min_id:
+                yield message
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = CheckpointStore(str(tmp_path / 'checkpoints.sqlite3'))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def ingestor_factory(tmp_path, store, monkeypatch):
+    queue = SQLiteWorkQueue(str(tmp_path / 'queue.sqlite3'))
+    monkeypatch.setattr(telegram_worker, 'get_checkpoint_store', lambda: store)
+    monkeypatch.setattr(telegram_worker, 'get_work_queue', lambda: queue)
+    downloaded = []
+
+    async def fake_download(self, message, file_name):
+        downloaded.append(message.id)
+        self.download_slots.release()
+
+    monkeypatch.setattr(telegram_worker.ChannelIngestor, '_download', fake_download)
+
+    def make(client):
+        ingestor = telegram_worker.ChannelIngestor(client, FakeChannel())
+        ingestor.downloaded = downloaded
+        return ingestor
+    yield make
+    queue.close()
+
+
+def test_live_message_does_not_advance_past_unscanned_ids(store):
+    checkpoint = ChannelCheckpoint(store, CHANNEL_ID, 100)
+    checkpoint.begin(105)
+    checkpoint.complete(105, 'hash', 1)
+    assert checkpoint.watermark() == 100
+    assert store.get_watermark(CHANNEL_ID) == 100
+
+
+def test_scanned_messages_advance_the_watermark(store):
+    checkpoint = ChannelCheckpoint(store, CHANNEL_ID, 100)
+    for message_id in (101, 102):
+        checkpoint.observe(message_id)
+        checkpoint.begin(message_id)
+    checkpoint.complete(102, 'b', 1)
+    assert checkpoint.watermark() == 100
+    checkpoint.complete(101, 'a', 1)
+    assert checkpoint.watermark() == 102
+
+
+def test_failed_message_holds_the_watermark(store):
+    checkpoint = ChannelCheckpoint(store, CHANNEL_ID, 100)
+    checkpoint.observe(101)
+    checkpoint.begin(101)
+    checkpoint.fail(101)
+    checkpoint.observe(110)
+    assert checkpoint.watermark() == 100
+
+
+def test_catch_up_after_live_message_fetches_the_gap(store, ingestor_factory):
+    store.set_watermark(CHANNEL_ID, 100)
+    client = FakeClient([FakeMessage(i) for i in range(101, 106)])
+    ingestor = ingestor_factory(client)
+
+    async def run():
+        # 105 arrives live while 101-104 were posted during a disconnect.
+        await ingestor.submit(FakeMessage(105), scanned=False)
+        await asyncio.gather(*ingestor.downloads)
+        ingestor.checkpoint.complete(105, 'hash-105', 1)
+        assert ingestor.checkpoint.watermark() == 100
+        await ingestor.catch_up()
+        await asyncio.gather(*ingestor.downloads)
+
+    asyncio.run(run())
+    assert client.min_ids == [100]
+    assert ingestor.downloaded == [105, 101, 102, 103, 104]
+    assert store.get_watermark(CHANNEL_ID) == 100
+
+
+def test_message_is_not_downloaded_twice(store, ingestor_factory):
+    store.set_watermark(CHANNEL_ID, 100)
+    ingestor = ingestor_factory(FakeClient([FakeMessage(101)]))
+
+    async def run():
+        await ingestor.submit(FakeMessage(101), scanned=False)
+        await ingestor.catch_up()
+        await asyncio.gather(*ingestor.downloads)
+
+    asyncio.run(run())
+    assert ingestor.downloaded == [101]
@@ -0,0 +1,99 @@
+import io
+import json
+import pytest
+from backend import text_formats
+from backend.text_formats import SNIFF_SIZE, detect_text_format, iter_leaks_from_text_stream
+
+
+def soft_block(i):
+    return f"SOFT: Chrome\nURL: https://site{i}.com/login\nUSER: user{i}\nPASS: pass{i}\n\n"
+
+
+def custom_block(i):
+    return f"URL: https://other{i}.com\nUsername: other{i}\nPassword: secret{i}\nApplication: Firefox\n===============\n"
+
+
+def parse(text, chunk_size=1024 * 1024):
+    return list(iter_leaks_from_text_stream(io.StringIO(text), chunk_size))
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 64, 333, 4096])
+def test_blocks_split_across_chunks_are_carried(chunk_size):
+    text = ''.join(soft_block(i) for i in range(20))
+    leaks = parse(text, chunk_size)
+    assert [leak['username'] for leak in leaks] == [f"user{i}" for i in range(20)]
+    assert leaks[-1]['password'] == 'pass19'
+
+
+@pytest.mark.parametrize('chunk_size', [1, 5, 100])
+def test_combolist_lines_split_across_chunks(chunk_size):
+    text = ''.join(f"https://site{i}.com:user{i}:pass{i}\n" for i in range(30))
+    leaks = parse(text, chunk_size)
+    assert [leak['password'] for leak in leaks] == [f"pass{i}" for i in range(30)]
+
+
+def test_bracketed_banner_is_not_json():
+    text = "[ RedLine log ]\n\n" + ''.join(soft_block(i) for i in range(3))
+    assert detect_text_format(text).name == 'mixed_blocks'
+    assert len(parse(text)) == 3
+
+
+@pytest.mark.parametrize('text', ["user@mail.com:hunter2", "user@mail.com:hunter2\n", "https://a.com:bob:pw\n"])
+def test_single_line_combolist(text):
+    assert detect_text_format(text).name == 'combolist'
+    assert len(parse(text)) == 1
+
+
+def test_layout_appearing_after_the_sample_is_parsed():
+    soft = ''.join(soft_block(i) for i in range(SNIFF_SIZE // 50))
+    assert len(soft) > SNIFF_SIZE
+    text = soft + custom_block(0)
+    leaks = parse(text)
+    assert leaks[-1]['username'] == 'other0'
+    assert len(leaks) == SNIFF_SIZE // 50 + 1
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 50, 1 << 20])
+def test_json_array_is_streamed(chunk_size):
+    records = [{'url': f"https://s{i}.com", 'username': f"u{i}", 'password': f"p{i}", 'n': 12345} for i in range(25)]
+    leaks = parse(json.dumps(records, indent=2), chunk_size)
+    assert leaks == records
+
+
+def test_json_export_takes_the_credential_list():
+    export = {
+        'encrypted': False,
+        'folders': [{'id': 'f1', 'name': 'Work'}],
+        'items': [{'name': 'GitHub', 'login': {'uris': [{'uri': 'https://github.com'}], 'username': 'bob', 'password': 'pw'}}],
+    }
+    leaks = parse(json.dumps(export), 16)
+    assert leaks == [{'software': 'GitHub', 'url': 'https://github.com', 'username': 'bob', 'password': 'pw'}]
+
+
+def test_truncated_json_keeps_complete_records():
+    text = json.dumps([{'username': 'a', 'password': 'b'}] * 3)[:-10]
+    assert parse(text, 8) == [{'username': 'a', 'password': 'b'}] * 2
+
+
+def test_top_level_browser_export_is_normalized():
+    records = [{'origin_url': 'https://a.com', 'username_value': 'bob', 'password_value': 'pw'}, {'id': 1}]
+    leaks = parse(json.dumps(records), 16)
+    assert [(leak['url'], leak['username'], leak['password']) for leak in leaks] == [('https://a.com', 'bob', 'pw')]
+
+
+def test_malformed_json_element_is_skipped_without_buffering_the_rest(monkeypatch):
+    peak = []
+    more = text_formats._JsonReader._more
+
+    def tracked_more(self):
+        result = more(self)
+        peak.append(len(self.buffer))
+        return result
+
+    monkeypatch.setattr(text_formats._JsonReader, '_more', tracked_more)
+    good = [json.dumps({'username': f"u{i}", 'password': f"p{i}"}) for i in range(20000)]
+    good[10] = '{"username": "broken", "password": oops}'
+    leaks = parse('[' + ', '.join(good) + ']', 4096)
+    assert len(leaks) == 19999
+    assert leaks[-1]['username'] == 'u19999'
+    assert max(peak) < 3 * 4096
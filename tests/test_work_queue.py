@@ -0,0 +1,140 @@
+import time
+import asyncio
+import sqlite3
+import pytest
+from backend import ingest_worker, work_queue
+from backend.ingest import register_handler
+from backend.work_queue import SQLiteWorkQueue
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(work_queue, 'WORK_RETRY_BACKOFF', 0)
+    q = SQLiteWorkQueue(str(tmp_path / 'queue.sqlite3'))
+    yield q
+    q.close()
+
+
+def expire_lease(queue, item):
+    with queue._lock:
+        queue._conn.execute("UPDATE work_items SET lease_expires = ? WHERE id = ?", (time.time() - 1, item.id))
+
+
+def test_claim_hands_out_each_item_once(queue):
+    item_id = queue.enqueue('upload', {'path': 'a.txt'})
+    item = queue.claim('w1')
+    assert (item.id, item.kind, item.payload, item.attempts) == (item_id, 'upload', {'path': 'a.txt'}, 1)
+    assert queue.claim('w2') is None
+    assert queue.get(item_id)['status'] == 'running'
+
+
+def test_claim_filters_by_kind(queue):
+    queue.enqueue('upload', {})
+    telegram_id = queue.enqueue('telegram_file', {})
+    assert queue.claim('w1', kinds=['telegram_file']).id == telegram_id
+    assert queue.claim('w1', kinds=['telegram_file']) is None
+
+
+def test_expired_lease_is_reclaimed(queue):
+    queue.enqueue('upload', {})
+    first = queue.claim('w1', lease_seconds=60)
+    expire_lease(queue, first)
+    second = queue.claim('w2')
+    assert second.id == first.id
+    assert second.attempts == 2
+    # The first owner finds out on its next heartbeat and cannot finish the item.
+    assert not queue.heartbeat(first, {'rows_parsed': 1})
+    queue.complete(first, {'rows_inserted': 1})
+    assert queue.get(first.id)['status'] == 'running'
+    assert queue.heartbeat(second, {'rows_parsed': 2})
+    assert queue.get(first.id)['progress'] == {'rows_parsed': 2}
+
+
+def test_failed_item_is_retried_then_given_up(queue):
+    item_id = queue.enqueue('upload', {}, max_attempts=2)
+    queue.fail(queue.claim('w1'), 'boom')
+    record = queue.get(item_id)
+    assert (record['status'], record['error']) == ('queued', 'boom')
+    item = queue.claim('w1')
+    assert item.attempts == 2 and item.last_attempt
+    queue.fail(item, 'boom again')
+    assert queue.get(item_id)['status'] == 'failed'
+    assert queue.claim('w1') is None
+
+
+def test_retry_waits_for_backoff(queue, monkeypatch):
+    monkeypatch.setattr(work_queue, 'WORK_RETRY_BACKOFF', 60)
+    item_id = queue.enqueue('upload', {})
+    queue.fail(queue.claim('w1'), 'boom')
+    assert queue.get(item_id)['status'] == 'queued'
+    assert queue.claim('w1') is None
+
+
+def test_permanent_failure_skips_retries(queue):
+    item_id = queue.enqueue('upload', {})
+    queue.fail(queue.claim('w1'), 'bad file', retry=False)
+    assert queue.get(item_id)['status'] == 'failed'
+
+
+def test_lease_expiring_on_final_attempt_fails_item(queue):
+    item_id = queue.enqueue('upload', {}, max_attempts=1)
+    expire_lease(queue, queue.claim('w1'))
+    assert queue.claim('w2') is None
+    record = queue.get(item_id)
+    assert (record['status'], record['error']) == ('failed', 'Lease expired on final attempt')
+
+
+def test_pending_and_data_version(queue):
+    assert queue.pending() == 0 and queue.data_version() == 0
+    queue.enqueue('upload', {})
+    queue.enqueue('telegram_file', {})
+    queue.complete(queue.claim('w1', kinds=['upload']), {})
+    assert queue.pending() == 1
+    assert queue.pending(kinds=['upload']) == 0
+    queue.bump_data_version()
+    queue.bump_data_version()
+    assert queue.data_version() == 2
+
+
+def test_backend_missing_a_method_fails_on_construction():
+    class Incomplete(work_queue.WorkQueue):
+        def enqueue(self, kind, payload, max_attempts=3):
+            return 'id'
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_slot_survives_queue_errors(queue, monkeypatch):
+    monkeypatch.setattr(ingest_worker, 'WORKER_POLL_INTERVAL', 0.01)
+    handled = []
+
+    async def handler(item, on_progress):
+        handled.append(item.id)
+        return {}
+
+    register_handler('slot_test', handler)
+    claim = queue.claim
+    calls = []
+
+    def flaky_claim(*args):
+        calls.append(1)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError('database is locked')
+        return claim(*args)
+
+    monkeypatch.setattr(queue, 'claim', flaky_claim)
+    item_id = queue.enqueue('slot_test', {})
+
+    async def run():
+        worker = ingest_worker.IngestWorker(queue=queue, concurrency=1, kinds=['slot_test'])
+        worker.start()
+        for _ in range(200):
+            await asyncio.sleep(0.01)
+            if handled:
+                break
+        await worker.stop()
+
+    asyncio.run(run())
+    assert handled == [item_id]
+    assert queue.get(item_id)['status'] == 'done'